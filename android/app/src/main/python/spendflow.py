@@ -1,44 +1,893 @@
+import argparse
+import asyncio
+import bisect
+import calendar
+import csv
+import hashlib
+import html
 import json
+import math
+import operator
 import os
-from datetime import datetime, date
+import re
+import shlex
+import shutil
+import threading
+import time
+import uuid
+import webbrowser
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from pathlib import Path
 
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
+
+try:
+    import numpy as np
+except ImportError:  # not bundled in the Android build
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
 
 DATA_FILE = "expenses.json"
 
+# Android / low-end devices: page old months out instead of keeping
+# every row and every history card resident.
+ON_ANDROID = "ANDROID_ARGUMENT" in os.environ or "ANDROID_ROOT" in os.environ
+LOW_MEMORY = ON_ANDROID or os.environ.get("SPENDFLOW_LOW_MEMORY") == "1"
+HISTORY_CAP = 150       # history cards kept on screen in low-memory mode
+RESIDENT_MONTHS = 3     # older months kept loaded besides the current one
+SHARD_DIR = "expenses"          # expenses/2025-11.json, one file per month
+BUDGETS_FILE = "budgets.json"   # budgets live outside the shards
+AGGREGATES_FILE = "aggregates.json"  # persisted month x category totals
+RECURRING_FILE = "recurring.json"    # recurring expense rules
+LIMITS_FILE = "category_budgets.json"  # per-category monthly limits
+RATES_FILE = "rates.json"            # local exchange-rate table
+BASE_CURRENCY = "INR"                # budgets and totals are in this
+REPORT_DIR = "reports"               # reports/2026-10.html, one per month
+RECEIPT_DIR = "receipts"             # receipts/ab/<sha256>.jpg, one per image
+THUMB_SIZE = 96                      # longest thumbnail side, pixels
+READ_LOCK_FILE = ".spendflow.lock"
+WRITE_LOCK_FILE = ".spendflow.write.lock"
+SYNC_STATE_FILE = "sync_state.json"  # this device's sync clock and peers
+
+
+# ---------- Money ---------- #
+
+# Amounts are integer paise everywhere; rupees only exist at the edges
+# (parsing user input, legacy files, and display). A row in another
+# currency keeps its own minor units in "paise" plus a "currency" code.
+
+CURRENCY_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+def to_paise(value):
+    """Exact paise for user text, a rupee amount (int/float) or Decimal."""
+    try:
+        rupees = Decimal(str(value).strip())
+        if not rupees.is_finite():
+            raise ValueError
+        # huge values ("1e30") overflow the context precision here
+        return int((rupees * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"not an amount: {value!r}")
+
+
+def row_paise(exp):
+    """Paise of an expense row (legacy rows still carry float rupees)."""
+    paise = exp.get("paise")
+    if paise is not None:
+        return paise
+    try:
+        return to_paise(exp.get("amount", 0))
+    except ValueError:
+        return 0
+
+
+def normalize_rows(rows):
+    """Convert legacy rupee rows to paise in place.
+
+    Legacy rows are also pinned to the key they had before conversion,
+    so their identity (change detection, sync) survives the rewrite.
+    """
+    for exp in rows:
+        if "paise" not in exp:
+            exp.setdefault("id", record_key(exp))
+            exp["paise"] = row_paise(exp)
+            exp.pop("amount", None)
+    return rows
+
+
+def _budgets_from(data):
+    if "budgets_paise" in data:
+        return data["budgets_paise"]
+    budgets = {}
+    for month, value in data.get("budgets", {}).items():
+        try:
+            budgets[month] = to_paise(value)
+        except ValueError:
+            continue
+    return budgets
+
+
+def paise_text(paise):
+    """Plain rupee text for an entry field, e.g. 125050 -> "1250.50"."""
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(int(paise)), 100)
+    return f"{sign}{rupees}.{rest:02d}"
+
+
+def format_money(paise, decimals=2, currency=BASE_CURRENCY):
+    """Display form of a paise amount, e.g. "₹1250.50" or "₹1251"."""
+    paise = int(round(paise))
+    sign = "-" if paise < 0 else ""
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+    if decimals:
+        return f"{sign}{symbol}{paise_text(abs(paise))}"
+    return f"{sign}{symbol}{(abs(paise) + 50) // 100}"
+
+
+def row_money(exp):
+    """Display form of a row's amount in its own currency."""
+    return format_money(row_paise(exp), currency=exp.get("currency", BASE_CURRENCY))
+
+
+# ---------- Exchange rates ---------- #
+
+class RateTable:
+    """Date-indexed rates into BASE_CURRENCY, kept in a local file.
+
+    ``rates[currency]`` is a sorted list of (date ordinal, rate); a
+    day uses the latest rate on or before it (the earliest one for days
+    before the table starts). Lookups are memoized per (currency, date
+    string), so converting many rows costs one bisect per distinct pair.
+    """
+
+    def __init__(self, rates=None):
+        self.rates = rates if rates is not None else {}
+        self.stamp = self._stamp()
+        self._memo = {}
+
+    def _stamp(self):
+        """Short content hash; persisted aggregates record it."""
+        if not self.rates:
+            return ""
+        text = json.dumps(
+            {c: [(o, str(r)) for o, r in v] for c, v in self.rates.items()},
+            sort_keys=True,
+        )
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, path=RATES_FILE):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return cls()
+        rates = {}
+        for currency, days in data.get("rates", {}).items():
+            series = []
+            for day, rate in days.items():
+                try:
+                    d = datetime.strptime(day, "%Y-%m-%d").date()
+                    series.append((d.toordinal(), Decimal(rate)))
+                except (TypeError, ValueError, InvalidOperation):
+                    continue
+            if series:
+                rates[currency] = sorted(series)
+        return cls(rates)
+
+    def save(self, path=RATES_FILE):
+        data = {
+            "base": BASE_CURRENCY,
+            "rates": {
+                currency: {
+                    date.fromordinal(o).isoformat(): str(r) for o, r in series
+                }
+                for currency, series in sorted(self.rates.items())
+            },
+        }
+        with WRITE_LOCK.hold():
+            try:
+                _commit_staged([_stage_json(path, data)])
+            except Exception as e:
+                print("Error saving rates:", e)
+
+    def import_csv(self, path):
+        """Merge ``date,currency,rate`` lines (header optional).
+
+        Dates may be YYYY-MM-DD or DD-MM-YYYY; a rate is the amount of
+        BASE_CURRENCY one unit of ``currency`` buys. Returns rows merged.
+        """
+        merged = {c: dict(v) for c, v in self.rates.items()}
+        count = 0
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                day, currency, rate = (cell.strip() for cell in row[:3])
+                try:
+                    d = _parse_rate_day(day)
+                    rate = Decimal(rate)
+                except (ValueError, InvalidOperation):
+                    continue  # header or junk line
+                if not rate.is_finite() or rate <= 0:
+                    continue
+                merged.setdefault(currency.upper(), {})[d.toordinal()] = rate
+                count += 1
+        merged.pop(BASE_CURRENCY, None)
+        self.rates = {c: sorted(v.items()) for c, v in merged.items()}
+        self.stamp = self._stamp()
+        self._memo.clear()
+        return count
+
+    def currencies(self):
+        return [BASE_CURRENCY] + sorted(self.rates)
+
+    def rate(self, currency, day):
+        """Rate for ``currency`` on a DD-MM-YYYY day, or None if unknown."""
+        key = (currency, day)
+        if key in self._memo:
+            return self._memo[key]
+        series = self.rates.get(currency)
+        rate = None
+        if series:
+            try:
+                ordinal = datetime.strptime(day, "%d-%m-%Y").toordinal()
+                i = bisect.bisect_right(series, (ordinal, Decimal("Infinity")))
+            except (TypeError, ValueError):
+                i = len(series)  # undated rows use the latest rate
+            rate = series[max(i - 1, 0)][1]
+        self._memo[key] = rate
+        return rate
+
+    def to_base(self, paise, currency, day):
+        if currency == BASE_CURRENCY:
+            return paise
+        rate = self.rate(currency, day)
+        if rate is None:
+            return 0  # no rate imported for it: not counted
+        return int((paise * rate).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    def convert_rows(self, rows):
+        """Base paise for each row, converting once per (currency, date)."""
+        out = []
+        groups = {}
+        for i, exp in enumerate(rows):
+            currency = exp.get("currency", BASE_CURRENCY)
+            paise = row_paise(exp)
+            if currency == BASE_CURRENCY:
+                out.append(paise)
+                continue
+            out.append(0)
+            groups.setdefault((currency, exp.get("date", "")), []).append((i, paise))
+        for (currency, day), members in groups.items():
+            rate = self.rate(currency, day)
+            if rate is None:
+                continue
+            for i, paise in members:
+                out[i] = int((paise * rate).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        return out
+
+
+def _parse_rate_day(text):
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"not a date: {text!r}")
+
+
+RATES = RateTable.load()
+
+
+def base_paise(exp):
+    """A row's amount in BASE_CURRENCY paise."""
+    currency = exp.get("currency", BASE_CURRENCY)
+    if currency == BASE_CURRENCY:
+        return row_paise(exp)
+    return RATES.to_base(row_paise(exp), currency, exp.get("date", ""))
+
 
 # ---------- Data helpers ---------- #
 
 def load_data():
-    """Load expenses + budgets from JSON. Supports old list-only format."""
-    if not os.path.exists(DATA_FILE):
-        return [], {}
+    """Load expenses + budgets. Uses month shards when SHARD_DIR exists,
+    otherwise the single JSON file (old list-only format supported)."""
+    doc = load_ledger()
+    return doc["expenses"], doc["budgets"]
+
+
+def load_ledger(months=None):
+    """Whole on-disk ledger as {"expenses", "budgets", "generation"}.
+
+    ``generation`` counts commits to the data; it lets a running app
+    tell another writer's change apart from its own. In the sharded
+    layout ``months`` limits which shards are read.
+    """
+    if os.path.isdir(SHARD_DIR):
+        return load_sharded(months)
 
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        # commits replace the file, so the handle opened under the lock
+        # stays a consistent snapshot while it is parsed without it
+        with READ_LOCK.hold(shared=True):
+            f = open(DATA_FILE, "rb")
+    except OSError:
+        return {"expenses": [], "budgets": {}, "generation": 0}
+    return read_ledger_file(f)
+
+
+def read_ledger_file(f, path=None):
+    """Parse an open single-file ledger (segmented or plain JSON)."""
+    path = path or DATA_FILE
+    doc = {"expenses": [], "budgets": {}, "generation": 0}
+    try:
+        with f:
+            if f.readline().rstrip(b"\r\n") == SEGMENT_MAGIC:
+                return _load_segments(f, doc, path)
+            f.seek(0)
+            data = json.load(f)  # plain JSON written by older versions
     except Exception:
-        return [], {}
+        return doc
 
     if isinstance(data, list):  # old format
-        return data, {}
+        doc["expenses"] = normalize_rows(data)
+        return doc
+
+    doc["expenses"] = normalize_rows(data.get("expenses", []))
+    doc["budgets"] = _budgets_from(data)
+    doc["generation"] = data.get("generation", 0)
+    return doc
+
+
+def save_data(expenses, budgets, months=None, generation=None):
+    """Persist the ledger.
+
+    In the sharded layout only the shards for ``months`` are rewritten
+    (all of them when ``months`` is None), plus the budgets file.
+    Files are staged first and swapped in under a short exclusive lock,
+    so readers never wait for the serialisation itself.
+    """
+    with WRITE_LOCK.hold():
+        if os.path.isdir(SHARD_DIR):
+            save_sharded(expenses, budgets, months, generation)
+            return
+
+        data = {"expenses": expenses, "budgets_paise": budgets}
+        if generation is not None:
+            data["generation"] = generation
+        try:
+            _commit_staged([_stage_segments(DATA_FILE, data)])
+        except Exception as e:
+            print("Error saving data:", e)
+
+
+def update_ledger(mutate):
+    """Read-modify-write the ledger as one serialised commit.
+
+    ``mutate(expenses, budgets)`` edits the lists in place and returns
+    the months it touched (or None for "maybe all"). Meant for tools
+    such as importers that share the data directory with the app.
+    """
+    with WRITE_LOCK.hold():
+        doc = load_ledger()
+        months = mutate(doc["expenses"], doc["budgets"])
+        save_data(
+            doc["expenses"],
+            doc["budgets"],
+            months=months,
+            generation=doc["generation"] + 1,
+        )
+        return doc
+
+
+def _stage_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    return tmp, path
+
 
+def _commit_staged(staged, removals=()):
+    with READ_LOCK.hold():
+        for tmp, path in staged:
+            os.replace(tmp, path)
+        for path in removals:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# ---------- Segmented file ---------- #
+
+# expenses.json is a magic line followed by one segment per line:
+#   <crc32 hex> <kind> <compact JSON>
+# "meta" holds budgets/generation and each "rows" segment a chunk of
+# expenses. The checksum covers "<kind> <JSON>", so a damaged segment
+# is detected (and skipped) without decoding it or any other segment.
+
+SEGMENT_MAGIC = b"SPENDFLOW-SEGMENTS 1"
+SEGMENT_ROWS = 256
+
+
+def _segment_line(kind, obj):
+    body = kind + b" " + json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+
+def _stage_segments(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
     expenses = data.get("expenses", [])
-    budgets = data.get("budgets", {})
-    return expenses, budgets
+    meta = {k: v for k, v in data.items() if k != "expenses"}
+    with open(tmp, "wb") as f:
+        f.write(SEGMENT_MAGIC + b"\n")
+        f.write(_segment_line(b"meta", meta))
+        for i in range(0, len(expenses), SEGMENT_ROWS):
+            f.write(_segment_line(b"rows", expenses[i:i + SEGMENT_ROWS]))
+    return tmp, path
+
+
+def _check_segment(line):
+    """(kind, payload bytes) if the line's checksum matches, else None."""
+    crc, _, body = line.rstrip(b"\r\n").partition(b" ")
+    try:
+        if int(crc, 16) != zlib.crc32(body):
+            return None
+    except ValueError:
+        return None
+    kind, _, payload = body.partition(b" ")
+    return kind, payload
+
+
+def _load_segments(f, doc, path):
+    damaged = 0
+    for line in f:
+        segment = _check_segment(line)
+        try:
+            kind, payload = segment
+            obj = json.loads(payload)
+        except (TypeError, ValueError):
+            damaged += 1
+            continue
+        if kind == b"meta":
+            doc["budgets"] = _budgets_from(obj)
+            doc["generation"] = obj.get("generation", 0)
+        elif kind == b"rows":
+            doc["expenses"].extend(normalize_rows(obj))
+    if damaged:
+        doc["damaged"] = damaged
+        _keep_damaged_copy(path)
+    return doc
+
+
+def _keep_damaged_copy(path):
+    """Save the raw bytes before the next commit rewrites the file."""
+    try:
+        with open(path, "rb") as src, open(path + ".damaged", "wb") as dst:
+            dst.write(src.read())
+        print(f"Damaged segments skipped in {path}; copy kept as {path}.damaged")
+    except OSError as e:
+        print("Error keeping damaged copy:", e)
+
+
+def verify_segments(path=None):
+    """{"segments", "damaged": [line numbers]} from checksums alone."""
+    path = path or DATA_FILE
+    report = {"segments": 0, "damaged": []}
+    with open(path, "rb") as f:
+        if f.readline().rstrip(b"\r\n") != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a segmented ledger")
+        for lineno, line in enumerate(f, 2):
+            report["segments"] += 1
+            if _check_segment(line) is None:
+                report["damaged"].append(lineno)
+    return report
+
+
+# ---------- Locking ---------- #
+
+class LedgerLock:
+    """Cross-process reader/writer lock on a file next to the ledger.
+
+    Uses ``flock`` where available. Threads of one process share a
+    single flock, held shared while only readers are in and exclusive
+    while a writer is; among themselves they follow the same rules, so
+    readers never wait for each other. Nested holds are re-entrant, but
+    asking for exclusive inside a shared hold raises (it cannot be
+    upgraded without deadlocking). Records how long each acquisition
+    had to wait.
+    """
+
+    SLOW_WAIT = 0.5  # seconds; longer waits are reported
+
+    def __init__(self, path):
+        self.path = path
+        self._cond = threading.Condition()
+        self._readers = {}   # thread id -> nesting depth of shared holds
+        self._writer = None  # thread id holding it exclusively
+        self._writer_depth = 0
+        self._fd = None
+        self.stats = {
+            mode: {"count": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for mode in ("shared", "exclusive")
+        }
 
+    @contextmanager
+    def hold(self, shared=False):
+        me = threading.get_ident()
+        with self._cond:
+            nested = self._writer == me or me in self._readers
+            if me in self._readers and not shared:
+                raise RuntimeError(
+                    f"{self.path}: exclusive hold requested inside a shared one"
+                )
+            if self._writer == me:
+                self._writer_depth += 1  # a writer may also read
+            elif nested:
+                self._readers[me] += 1
+        if nested:
+            try:
+                yield
+            finally:
+                self._release(me)
+            return
 
-def save_data(expenses, budgets):
-    data = {"expenses": expenses, "budgets": budgets}
+        mode = "shared" if shared else "exclusive"
+        start = time.perf_counter()
+        with self._cond:
+            if shared:
+                self._cond.wait_for(lambda: self._writer is None)
+                first = not self._readers
+                self._readers[me] = 1
+            else:
+                self._cond.wait_for(
+                    lambda: self._writer is None and not self._readers
+                )
+                first = True
+                self._writer, self._writer_depth = me, 1
+            if first:
+                # nobody else in this process holds it, so taking the
+                # flock here (even if it blocks) delays no reader of ours
+                try:
+                    self._lock_file(shared)
+                except BaseException:
+                    self._readers.pop(me, None)
+                    if self._writer == me:
+                        self._writer, self._writer_depth = None, 0
+                    self._cond.notify_all()
+                    raise
+            self._record(mode, time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release(me)
+
+    def _lock_file(self, shared):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+        self._fd = fd
+
+    def _release(self, me):
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth -= 1
+                if self._writer_depth:
+                    return
+                self._writer = None
+            else:
+                self._readers[me] -= 1
+                if self._readers[me]:
+                    return
+                del self._readers[me]
+            if self._writer is None and not self._readers:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+            self._cond.notify_all()
+
+    def _record(self, mode, waited):
+        st = self.stats[mode]
+        st["count"] += 1
+        st["wait_total"] += waited
+        st["wait_max"] = max(st["wait_max"], waited)
+        if waited > self.SLOW_WAIT:
+            print(f"Waited {waited:.2f}s for {mode} lock on {self.path}")
+
+
+READ_LOCK = LedgerLock(READ_LOCK_FILE)
+WRITE_LOCK = LedgerLock(WRITE_LOCK_FILE)
+
+
+def lock_stats():
+    """Lock-wait metrics for this process, keyed by lock then mode."""
+    out = {}
+    for name, lock in (("read", READ_LOCK), ("write", WRITE_LOCK)):
+        out[name] = {}
+        for mode, st in lock.stats.items():
+            avg = st["wait_total"] / st["count"] if st["count"] else 0.0
+            out[name][mode] = dict(st, wait_avg=avg)
+    return out
+
+
+# ---------- Month shards ---------- #
+
+UNDATED_SHARD = "undated"
+PARALLEL_SHARD_MIN = 8          # below this a process pool costs more than it saves
+
+
+def shard_month(exp):
+    """Shard key ("YYYY-MM") an expense belongs to."""
+    try:
+        y, m = month_from_str(exp.get("date", ""))
+    except (TypeError, ValueError):
+        return UNDATED_SHARD
+    return f"{y:04d}-{m:02d}"
+
+
+def shard_path(month):
+    return os.path.join(SHARD_DIR, f"{month}.json")
+
+
+def list_shard_months():
+    if not os.path.isdir(SHARD_DIR):
+        return []
+    return sorted(
+        name[:-5] for name in os.listdir(SHARD_DIR) if name.endswith(".json")
+    )
+
+
+def _shard_bytes(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _parse_shard(raw):
+    try:
+        rows = json.loads(raw)
+    except Exception:
+        return []
+    return normalize_rows(rows) if isinstance(rows, list) else []
+
+
+def _read_shard(path):
+    return _parse_shard(_shard_bytes(path))
+
+
+def _aggregate_shard(path):
+    total = 0
+    per_cat, per_tag = {}, {}
+    rows = _read_shard(path)
+    for exp, amt in zip(rows, RATES.convert_rows(rows)):
+        total += amt
+        cat = exp.get("category", "Other")
+        per_cat[cat] = per_cat.get(cat, 0) + amt
+        for tag in exp.get("tags", ()):
+            per_tag[tag] = per_tag.get(tag, 0) + amt
+    return total, per_cat, per_tag
+
+
+def _pool_context():
+    """Start method for shard workers: never a plain fork.
+
+    The app process hosts Tk and worker threads, and forking it can
+    deadlock the child; a fork server (or a fresh interpreter) cannot.
+    """
+    import multiprocessing
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_shard_worker(rates):
+    # workers do not inherit our state: convert with the caller's rates
+    global RATES
+    RATES = RateTable(rates)
+
+
+def _map_shards(func, paths):
+    """Run ``func`` over shard paths (or contents), in a process pool when worth it.
+
+    Falls back to a plain loop where process pools are unavailable
+    (e.g. the Android build) or there are only a few shards.
+    """
+    if len(paths) >= PARALLEL_SHARD_MIN:
+        # workers may run in another directory than ours
+        paths = [os.path.abspath(p) if isinstance(p, str) else p for p in paths]
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(
+                mp_context=_pool_context(),
+                initializer=_init_shard_worker,
+                initargs=(RATES.rates,),
+            ) as pool:
+                chunk = max(1, len(paths) // (4 * (os.cpu_count() or 1)))
+                return list(pool.map(func, paths, chunksize=chunk))
+        except Exception:
+            pass
+    return [func(p) for p in paths]
+
+
+def _read_budgets_file():
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
+        with open(BUDGETS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return {}, 0
+    return _budgets_from(data), data.get("generation", 0)
+
+
+def load_sharded(months=None):
+    # only the file reads happen under the shared lock; parsing, which
+    # is the slow part, runs after it so commits need not wait for it
+    with READ_LOCK.hold(shared=True):
+        if months is None:
+            months = list_shard_months()
+        raws = [_shard_bytes(shard_path(m)) for m in months]
+        budgets, generation = _read_budgets_file()
+    expenses = []
+    for rows in _map_shards(_parse_shard, [r for r in raws if r is not None]):
+        expenses.extend(rows)
+    # shards are grouped by month; restore insertion order across them
+    expenses.sort(key=lambda e: e.get("created_at") or "")
+    return {"expenses": expenses, "budgets": budgets, "generation": generation}
+
+
+def save_sharded(expenses, budgets, months=None, generation=None):
+    groups = {}
+    for exp in expenses:
+        key = shard_month(exp)
+        if months is None or key in months:
+            groups.setdefault(key, []).append(exp)
+
+    targets = set(groups) if months is None else set(months)
+    if months is None:
+        targets.update(list_shard_months())  # drop shards emptied by deletes
+
+    try:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        staged, removals = [], []
+        for month in targets:
+            rows = groups.get(month)
+            if rows:
+                staged.append(_stage_json(shard_path(month), rows))
+            else:
+                removals.append(shard_path(month))
+        meta = {"budgets_paise": budgets}
+        if generation is not None:
+            meta["generation"] = generation
+        staged.append(_stage_json(BUDGETS_FILE, meta))
+        _commit_staged(staged, removals)
     except Exception as e:
         print("Error saving data:", e)
 
 
+def aggregate_months(months=None):
+    """Total, per-category and per-tag spend for each month, shard-parallel."""
+    months = list_shard_months() if months is None else list(months)
+    months = [m for m in months if os.path.exists(shard_path(m))]
+    results = _map_shards(_aggregate_shard, [shard_path(m) for m in months])
+    out = {}
+    for month, (total, per_cat, per_tag) in zip(months, results):
+        merged = {}
+        for cat, amt in per_cat.items():
+            name = CATEGORIES.canonical(cat)
+            merged[name] = merged.get(name, 0) + amt
+        out[month] = (total, merged, per_tag)
+    return out
+
+
+def migrate_to_shards():
+    """Move the single-file ledger into month shards (keeps a .bak)."""
+    with WRITE_LOCK.hold():
+        if os.path.isdir(SHARD_DIR):
+            return False
+        doc = load_ledger()
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        save_sharded(
+            doc["expenses"], doc["budgets"], generation=doc["generation"] + 1
+        )
+        if os.path.exists(DATA_FILE):
+            os.replace(DATA_FILE, DATA_FILE + ".bak")
+        return True
+
+
+# ---------- Change detection ---------- #
+
+WATCH_INTERVAL_MS = 2000
+
+
+def record_key(exp):
+    """Stable identity of an expense row across processes."""
+    rid = exp.get("id")
+    if rid:
+        return rid
+    # rows written before ids existed
+    fields = ("created_at", "date", "amount", "category", "note")
+    return "|".join(str(exp.get(k, "")) for k in fields)
+
+
+def storage_paths():
+    if os.path.isdir(SHARD_DIR):
+        paths = [BUDGETS_FILE] + [shard_path(m) for m in list_shard_months()]
+    else:
+        paths = [DATA_FILE]
+    return paths + [RECURRING_FILE, LIMITS_FILE]
+
+
+def storage_signature():
+    """{path: (mtime_ns, size)} for every file the ledger lives in."""
+    sig = {}
+    for path in storage_paths():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        sig[path] = (st.st_mtime_ns, st.st_size)
+    return sig
+
+
+class LedgerWatcher:
+    """Cheap stat-based polling for writes made by other processes."""
+
+    def __init__(self):
+        self.signature = storage_signature()
+
+    def poll(self):
+        """Paths added, changed or removed since the last sync."""
+        sig = storage_signature()
+        if sig == self.signature:
+            return set()
+        old = self.signature
+        return {p for p in set(old) | set(sig) if old.get(p) != sig.get(p)}
+
+    def mark_synced(self):
+        self.signature = storage_signature()
+
+
+def read_changes(paths):
+    """Re-read only the part of the ledger behind ``paths``.
+
+    Returns (rows, months, budgets, generation). ``months`` is the set
+    of shards that were re-read, or None when the whole ledger was.
+    """
+    if not os.path.isdir(SHARD_DIR):
+        doc = load_ledger()
+        return doc["expenses"], None, doc["budgets"], doc["generation"]
+
+    months = {
+        os.path.basename(p)[:-5]
+        for p in paths
+        if os.path.dirname(p) == SHARD_DIR
+    }
+    rows = []
+    with READ_LOCK.hold(shared=True):
+        for month in sorted(months):
+            rows.extend(_read_shard(shard_path(month)))
+        budgets, generation = _read_budgets_file()
+    rows.sort(key=lambda e: e.get("created_at") or "")
+    return rows, months, budgets, generation
+
+
 def get_today_str():
     return date.today().strftime("%d-%m-%Y")
 
@@ -52,6 +901,2431 @@ def month_from_str(dstr):
     return dt.year, dt.month
 
 
+def month_bounds(y, m):
+    """First and last calendar day of a month."""
+    return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+
+
+# ---------- Categories ---------- #
+
+# (substrings, color) checked in order against the folded category name
+CATEGORY_COLOR_RULES = (
+    (("food",), "#4ade80"),  # green
+    (("travel", "fuel"), "#38bdf8"),  # blue
+    (("bill", "rent"), "#eab308"),  # yellow
+    (("entertain", "party"), "#a855f7"),  # purple
+    (("shop",), "#f97316"),  # orange
+)
+DEFAULT_CATEGORY_COLOR = "#38bdf8"
+
+# "Food/Groceries" is Groceries under Food; rows may nest any depth
+CATEGORY_SEP = "/"
+
+CategoryStyle = namedtuple("CategoryStyle", "cid name color")
+
+
+def category_path(name):
+    """Tidy a category path: "Food / Groceries " -> "Food/Groceries"."""
+    parts = (" ".join(p.split()) for p in str(name or "").split(CATEGORY_SEP))
+    return CATEGORY_SEP.join(p for p in parts if p)
+
+
+def category_key(name):
+    """Fold case/whitespace variants ("food", "Food ") to one lookup key."""
+    return category_path(name).casefold()
+
+
+def normalize_tags(value):
+    """Sorted unique tags from a list or "trip, #work" style text."""
+    if isinstance(value, str):
+        value = value.split(",")
+    tags = {" ".join(str(t).strip().lstrip("#").split()).casefold() for t in value or ()}
+    return sorted(t for t in tags if t)
+
+
+def _match_category_color(key):
+    # a subcategory shares its top-level category's color
+    root = key.split(CATEGORY_SEP, 1)[0]
+    for needles, color in CATEGORY_COLOR_RULES:
+        if any(n in root for n in needles):
+            return color
+    return DEFAULT_CATEGORY_COLOR
+
+
+class CategoryRegistry:
+    """Interns category names to small integer ids.
+
+    Every raw spelling seen is remembered, so after the first lookup a
+    category resolves with a single dict hit and its color / display name
+    come from a per-id cache instead of re-running the substring rules.
+    """
+
+    def __init__(self):
+        self._by_key = {}    # folded key -> id
+        self._by_raw = {}    # exact raw string -> id
+        self.styles = []     # id -> CategoryStyle
+        self._chains = {}    # id -> canonical names, root first
+        self._lock = threading.Lock()  # report threads intern too
+
+    def __len__(self):
+        return len(self.styles)
+
+    def intern(self, name):
+        cid = self._by_raw.get(name)
+        if cid is not None:
+            return cid
+
+        display = category_path(name) or "Other"
+        parent, _, leaf = display.rpartition(CATEGORY_SEP)
+        if parent:
+            # "food/Dining" files under whichever spelling "Food" has
+            display = self.canonical(parent) + CATEGORY_SEP + leaf
+        key = category_key(display)
+        with self._lock:
+            cid = self._by_key.get(key)
+            if cid is None:
+                cid = len(self.styles)
+                self.styles.append(
+                    CategoryStyle(cid, display, _match_category_color(key))
+                )
+                self._by_key[key] = cid
+            if isinstance(name, str):
+                self._by_raw[name] = cid
+        return cid
+
+    def style(self, name):
+        return self.styles[self.intern(name)]
+
+    def name(self, cid):
+        return self.styles[cid].name
+
+    def canonical(self, name):
+        """Shared display string for every variant of ``name``."""
+        return self.styles[self.intern(name)].name
+
+    def ancestors(self, name):
+        """Canonical names of ``name`` and each of its parents, root first."""
+        cid = self.intern(name)
+        chain = self._chains.get(cid)
+        if chain is None:
+            parts = self.styles[cid].name.split(CATEGORY_SEP)
+            chain = tuple(
+                self.canonical(CATEGORY_SEP.join(parts[:i]))
+                for i in range(1, len(parts))
+            ) + (self.styles[cid].name,)
+            self._chains[cid] = chain
+        return chain
+
+    def intern_expenses(self, expenses):
+        """Rewrite each row's category to its canonical (shared) string."""
+        for exp in expenses:
+            exp["category"] = self.canonical(exp.get("category", "Other"))
+        return expenses
+
+
+CATEGORIES = CategoryRegistry()
+
+
+def category_rollup(per_cat):
+    """{category: paise} with each amount also added to every ancestor."""
+    tree = {}
+    for cat, paise in per_cat.items():
+        for node in CATEGORIES.ancestors(cat):
+            tree[node] = tree.get(node, 0) + paise
+    return tree
+
+
+def tree_order(tree):
+    """Rollup keys parent-before-children, siblings by spend."""
+    return sorted(
+        tree,
+        key=lambda n: [(-tree.get(a, 0), a) for a in CATEGORIES.ancestors(n)],
+    )
+
+
+# ---------- Analytics ---------- #
+
+def _percentile(sorted_vals, q):
+    """Linear-interpolated percentile (same rule as numpy's default)."""
+    if not sorted_vals:
+        return 0.0
+    pos = (len(sorted_vals) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+class AnalyticsEngine:
+    """Column-oriented view of the ledger for heavy aggregations.
+
+    Expenses are loaded once into parallel columns (paise, date ordinal,
+    month index, category id). With NumPy available every group-by is a
+    vectorised ``bincount``; otherwise the same queries run as plain
+    Python loops over the columns.
+    """
+
+    def __init__(self, expenses, use_numpy=None):
+        self.use_numpy = (np is not None) if use_numpy is None else use_numpy
+        amounts, ordinals, months, cids = [], [], [], []
+        for exp, amt in zip(expenses, RATES.convert_rows(expenses)):
+            try:
+                d = datetime.strptime(exp.get("date", ""), "%d-%m-%Y").date()
+            except (TypeError, ValueError):
+                continue
+            amounts.append(amt)
+            ordinals.append(d.toordinal())
+            months.append(d.year * 12 + d.month - 1)
+            cids.append(CATEGORIES.intern(exp.get("category", "Other")))
+
+        if self.use_numpy:
+            self.amounts = np.asarray(amounts, dtype=np.int64)
+            self.ordinals = np.asarray(ordinals, dtype=np.int64)
+            self.months = np.asarray(months, dtype=np.int64)
+            self.cids = np.asarray(cids, dtype=np.int64)
+        else:
+            self.amounts, self.ordinals = amounts, ordinals
+            self.months, self.cids = months, cids
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def _mask(self, start, end):
+        """Row selector for an inclusive [start, end] date range."""
+        lo = start.toordinal() if start else None
+        hi = end.toordinal() if end else None
+        if self.use_numpy:
+            mask = np.ones(len(self.ordinals), dtype=bool)
+            if lo is not None:
+                mask &= self.ordinals >= lo
+            if hi is not None:
+                mask &= self.ordinals <= hi
+            return mask
+        return [
+            (lo is None or o >= lo) and (hi is None or o <= hi)
+            for o in self.ordinals
+        ]
+
+    def total(self, start=None, end=None):
+        mask = self._mask(start, end)
+        if self.use_numpy:
+            return int(self.amounts[mask].sum())
+        return sum(a for a, keep in zip(self.amounts, mask) if keep)
+
+    def daily_totals(self, start=None, end=None):
+        """{date: total} for days that have spending."""
+        mask = self._mask(start, end)
+        if self.use_numpy:
+            days, inverse = np.unique(self.ordinals[mask], return_inverse=True)
+            sums = np.bincount(inverse, weights=self.amounts[mask])
+            pairs = zip(days.tolist(), np.rint(sums).astype(np.int64).tolist())
+        else:
+            acc = {}
+            for amt, o, keep in zip(self.amounts, self.ordinals, mask):
+                if keep:
+                    acc[o] = acc.get(o, 0) + amt
+            pairs = acc.items()
+        return {date.fromordinal(o): v for o, v in pairs}
+
+    def daily_burn_rate(self, start, end=None):
+        """Average paise per calendar day in [start, end] (end: today)."""
+        end = end or date.today()
+        days = (end - start).days + 1
+        if days <= 0:
+            return 0.0
+        return self.total(start, end) / days
+
+    def percentiles(self, qs=(50, 90, 99), start=None, end=None):
+        """{q: paise} percentiles of single-expense amounts."""
+        mask = self._mask(start, end)
+        if self.use_numpy:
+            vals = self.amounts[mask]
+            if not len(vals):
+                return {q: 0.0 for q in qs}
+            return dict(zip(qs, np.percentile(vals, qs).tolist()))
+        vals = sorted(a for a, keep in zip(self.amounts, mask) if keep)
+        return {q: _percentile(vals, q) for q in qs}
+
+    def top_days(self, n=5, start=None, end=None):
+        """The ``n`` highest-spend days as [(date, total)], largest first."""
+        daily = self.daily_totals(start, end)
+        if self.use_numpy and len(daily) > n:
+            days = list(daily)
+            vals = np.fromiter(daily.values(), dtype=np.int64, count=len(days))
+            idx = np.argpartition(-vals, n)[:n]
+            picked = [(days[i], int(vals[i])) for i in idx]
+        else:
+            picked = list(daily.items())
+        picked.sort(key=lambda dv: dv[1], reverse=True)
+        return picked[:n]
+
+
+# ---------- In-memory store ---------- #
+
+class ExpenseStore:
+    """The loaded ledger plus the incremental indexes kept in step with it.
+
+    An index is any object with ``add(exp)`` / ``remove(exp)``; it sees
+    every row once when attached and then each change as it happens.
+    ``version`` bumps on every change so derived caches can tell they
+    are stale.
+
+    In low-memory mode only some months are resident: ``page_in`` /
+    ``page_out`` change what is loaded without changing the ledger, and
+    indexes that describe the whole ledger (rather than the loaded
+    rows) implement ``page_in`` / ``page_out`` as no-ops.
+    """
+
+    def __init__(self, expenses=None, budgets=None, generation=0):
+        self.expenses = expenses if expenses is not None else []
+        self.budgets = budgets if budgets is not None else {}
+        self.generation = generation
+        self.indexes = []
+        self.version = 0
+        self.by_key = {record_key(e): e for e in self.expenses}
+        # keys known to be on disk, to tell external deletes from unsaved adds
+        self.synced_keys = set(self.by_key)
+        self.synced_budgets = dict(self.budgets)  # budgets as last on disk
+        self.is_resident = None  # month -> bool, None when everything is
+
+    def attach(self, index, replay=True):
+        if replay:
+            for exp in self.expenses:
+                index.add(exp)
+        self.indexes.append(index)
+        return index
+
+    def page_in(self, rows):
+        """Make rows already on disk resident (ledger unchanged)."""
+        fresh = [e for e in rows if record_key(e) not in self.by_key]
+        for exp in fresh:
+            key = record_key(exp)
+            self.by_key[key] = exp
+            self.synced_keys.add(key)
+            for index in self.indexes:
+                getattr(index, "page_in", index.add)(exp)
+        self.expenses.extend(fresh)
+        self.expenses.sort(key=lambda e: e.get("created_at") or "")
+        self.version += 1
+
+    def page_out(self, month):
+        """Drop a month's rows from memory (ledger unchanged)."""
+        keep = []
+        for exp in self.expenses:
+            if shard_month(exp) != month:
+                keep.append(exp)
+                continue
+            key = record_key(exp)
+            self.by_key.pop(key, None)
+            self.synced_keys.discard(key)
+            for index in self.indexes:
+                getattr(index, "page_out", index.remove)(exp)
+        self.expenses[:] = keep
+        self.version += 1
+
+    def add(self, exp):
+        self.expenses.append(exp)
+        self.by_key[record_key(exp)] = exp
+        for index in self.indexes:
+            index.add(exp)
+        self.version += 1
+
+    def remove(self, exp):
+        self.expenses.remove(exp)
+        self.by_key.pop(record_key(exp), None)
+        for index in self.indexes:
+            index.remove(exp)
+        self.version += 1
+
+    def pop(self):
+        exp = self.expenses[-1]
+        self.remove(exp)
+        return exp
+
+    def merge(self, rows, months=None):
+        """Fold rows re-read from disk into memory.
+
+        Only rows whose key is new are added; rows that were on disk at
+        the last sync and are now gone (within ``months`` if given) were
+        deleted elsewhere and are dropped. Returns (added, removed).
+        """
+        disk = {record_key(e): e for e in rows}
+        added = []
+        for key, exp in disk.items():
+            mine = self.by_key.get(key)
+            if mine is not None:
+                # a sync may have versioned the row; keep that metadata
+                for field in SYNC_FIELDS:
+                    if field in exp:
+                        mine[field] = exp[field]
+            # keys in synced_keys but not in memory were deleted here
+            elif key not in self.synced_keys:
+                if self.is_resident and not self.is_resident(shard_month(exp)):
+                    continue
+                self.add(exp)
+                added.append(exp)
+
+        removed = []
+        for key in self.synced_keys - set(disk):
+            exp = self.by_key.get(key)
+            if exp is None:
+                continue
+            if months is not None and shard_month(exp) not in months:
+                continue
+            self.remove(exp)
+            removed.append(exp)
+
+        if months is None:
+            self.synced_keys = set(disk)
+        else:
+            self.synced_keys = {
+                k for k in self.synced_keys
+                if k not in self.by_key or shard_month(self.by_key[k]) not in months
+            }
+            self.synced_keys.update(disk)
+        return added, removed
+
+    def merge_budgets(self, disk):
+        """Take budgets re-read from disk, keeping unsaved local edits.
+
+        A month whose budget still matches the last sync follows the
+        disk, including a budget removed there. Returns True on change.
+        """
+        changed = False
+        for month in set(self.budgets) | set(disk):
+            mine = self.budgets.get(month)
+            if mine != self.synced_budgets.get(month) or mine == disk.get(month):
+                continue  # edited here and not saved yet, or unchanged
+            if month in disk:
+                self.budgets[month] = disk[month]
+            else:
+                del self.budgets[month]
+            changed = True
+        self.synced_budgets = dict(disk)
+        return changed
+
+    def mark_synced(self):
+        self.synced_keys = set(self.by_key)
+        self.synced_budgets = dict(self.budgets)
+
+
+class MonthCube:
+    """Month x category spend totals for the whole ledger.
+
+    Maintained incrementally as a store index and persisted next to the
+    ledger, so month totals never need the rows themselves; paging rows
+    in or out of memory leaves it untouched. Each row also updates every
+    ancestor of its category and each of its tags, so a subtree or tag
+    total is one lookup.
+    """
+
+    def __init__(self, months=None, generation=None, tags=None):
+        self.months = months if months is not None else {}  # month -> {cat: paise}
+        self.tags = tags if tags is not None else {}  # month -> {tag: paise}
+        self.tree = {m: category_rollup(c) for m, c in self.months.items()}
+        self.generation = generation
+        self.grand_total = sum(sum(c.values()) for c in self.months.values())
+
+    @staticmethod
+    def _bump(table, month, key, delta):
+        cell = table.setdefault(month, {})
+        value = cell.get(key, 0) + delta
+        if value:
+            cell[key] = value
+        else:
+            cell.pop(key, None)
+        if not cell:
+            del table[month]
+
+    def _apply(self, exp, sign):
+        month = shard_month(exp)
+        cat = CATEGORIES.canonical(exp.get("category", "Other"))
+        delta = sign * base_paise(exp)
+        self._bump(self.months, month, cat, delta)
+        for node in CATEGORIES.ancestors(cat):
+            self._bump(self.tree, month, node, delta)
+        for tag in exp.get("tags", ()):
+            self._bump(self.tags, month, tag, delta)
+        self.grand_total += delta
+
+    def add(self, exp):
+        self._apply(exp, 1)
+
+    def remove(self, exp):
+        self._apply(exp, -1)
+
+    def page_in(self, exp):
+        pass
+
+    def page_out(self, exp):
+        pass
+
+    def total(self, month):
+        return sum(self.months.get(month, {}).values())
+
+    def subtree(self, month, category):
+        """Spend in ``category`` and everything under it for one month."""
+        return self.tree.get(month, {}).get(category, 0)
+
+    @staticmethod
+    def _sum(table, months):
+        out = {}
+        for month in months:
+            for key, paise in table.get(month, {}).items():
+                out[key] = out.get(key, 0) + paise
+        return out
+
+    def period_totals(self, months):
+        """{category: paise} summed over month keys, rows untouched."""
+        return self._sum(self.months, months)
+
+    def period_tree(self, months):
+        """{category or ancestor: subtree paise} over month keys."""
+        return self._sum(self.tree, months)
+
+    def period_tags(self, months):
+        return self._sum(self.tags, months)
+
+    def category_totals(self, month):
+        return dict(self.months.get(month, {}))
+
+    def rebuild_month(self, month, rows):
+        """Replace one month's cell from freshly read rows."""
+        self.grand_total -= self.total(month)
+        for table in (self.months, self.tree, self.tags):
+            table.pop(month, None)
+        for exp in rows:
+            self.add(exp)
+
+    @classmethod
+    def load(cls, generation):
+        """Persisted cube if it matches ``generation``, else a rebuild."""
+        try:
+            with open(AGGREGATES_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (data.get("generation") == generation
+                    and data.get("rates", "") == RATES.stamp):
+                return cls(data["months"], generation, data.get("tags", {}))
+        except Exception:
+            pass
+        months, tags = {}, {}
+        for month, (_, per_cat, per_tag) in aggregate_months().items():
+            months[month] = {c: v for c, v in per_cat.items() if v}
+            tags[month] = {t: v for t, v in per_tag.items() if v}
+        return cls(
+            {m: c for m, c in months.items() if c},
+            generation,
+            {m: t for m, t in tags.items() if t},
+        )
+
+    @classmethod
+    def merged(cls, cubes):
+        """One cube summing several (e.g. one per ledger)."""
+        months, tags = {}, {}
+        for cube in cubes:
+            for table, out in ((cube.months, months), (cube.tags, tags)):
+                for month, cell in table.items():
+                    for key, paise in cell.items():
+                        cls._bump(out, month, key, paise)
+        return cls(months, tags=tags)
+
+    def save(self, generation):
+        self.generation = generation
+        data = {
+            "generation": generation,
+            "rates": RATES.stamp,
+            "months": self.months,
+            "tags": self.tags,
+        }
+        try:
+            tmp, path = _stage_json(AGGREGATES_FILE, data)
+            os.replace(tmp, path)
+        except Exception as e:
+            print("Error saving aggregates:", e)
+
+
+class DayTotals:
+    """Spend per calendar day for the whole ledger ({date: paise}).
+
+    A store index like the month cube. In low-memory mode a month that
+    is not resident is read from its shard the first time a view asks
+    for its year. Changed days collect in ``dirty`` so a view can
+    recolour just those.
+    """
+
+    def __init__(self, complete=True):
+        self.days = {}
+        self.loaded = None if complete else set()  # months read from shards
+        self.dirty = set()
+
+    def _apply(self, exp, sign):
+        day = _row_day(exp)
+        if day is None:
+            return
+        value = self.days.get(day, 0) + sign * base_paise(exp)
+        if value:
+            self.days[day] = value
+        else:
+            self.days.pop(day, None)
+        self.dirty.add(day)
+
+    def add(self, exp):
+        self._apply(exp, 1)
+
+    def remove(self, exp):
+        self._apply(exp, -1)
+
+    def page_in(self, exp):
+        pass
+
+    def page_out(self, exp):
+        pass
+
+    def rebuild_month(self, month, rows):
+        """Replace one month's days from freshly read rows."""
+        y, m = (int(part) for part in month.split("-"))
+        first, last = month_bounds(y, m)
+        for n in range(first.toordinal(), last.toordinal() + 1):
+            day = date.fromordinal(n)
+            if self.days.pop(day, None) is not None:
+                self.dirty.add(day)
+        for exp in rows:
+            self.add(exp)
+        if self.loaded is not None:
+            self.loaded.add(month)
+
+    def year(self, year):
+        """{date: paise} for one year, reading any months not yet loaded."""
+        if self.loaded is not None:
+            missing = [f"{year:04d}-{m:02d}" for m in range(1, 13)]
+            missing = [m for m in missing if m not in self.loaded]
+            paths = [shard_path(m) for m in missing]
+            for month, rows in zip(missing, _map_shards(_read_shard, paths)):
+                self.rebuild_month(month, rows)
+        return {d: v for d, v in self.days.items() if d.year == year}
+
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+
+class MonthPager:
+    """LRU of resident months for low-memory mode.
+
+    Pinned months (the current one) always stay loaded; other months
+    are read from their shard on demand and the least recently used is
+    evicted once more than ``capacity`` are resident.
+    """
+
+    def __init__(self, store, pinned, capacity=RESIDENT_MONTHS):
+        self.store = store
+        self.pinned = set(pinned)
+        self.capacity = capacity
+        self.lru = OrderedDict()
+        self.evictions = 0
+        store.is_resident = self.is_resident
+
+    def is_resident(self, month):
+        return month in self.pinned or month in self.lru
+
+    def _page_in(self, month):
+        rows = CATEGORIES.intern_expenses(_read_shard(shard_path(month)))
+        self.store.page_in(rows)
+
+    def _trim(self):
+        while len(self.lru) > self.capacity:
+            old, _ = self.lru.popitem(last=False)
+            self.store.page_out(old)
+            self.evictions += 1
+
+    def ensure(self, month):
+        if month in self.pinned:
+            return
+        if month in self.lru:
+            self.lru.move_to_end(month)
+            return
+        self._page_in(month)
+        self.lru[month] = True
+        self._trim()
+
+    @contextmanager
+    def hold(self, months):
+        """Keep ``months`` resident for the block, however many there are.
+
+        A batch may touch more months than the LRU holds; evicting one
+        before the save would rewrite its shard without its rows.
+        """
+        held = set(months) - self.pinned
+        for month in held:
+            if self.lru.pop(month, None) is None:
+                self._page_in(month)
+        self.pinned |= held
+        try:
+            yield
+        finally:
+            self.pinned -= held
+            for month in sorted(held):
+                self.lru[month] = True
+            self._trim()
+
+    def older_month(self):
+        """Most recent month on disk that is not resident yet."""
+        for month in reversed(list_shard_months()):
+            if month != UNDATED_SHARD and not self.is_resident(month):
+                return month
+        return None
+
+
+class Period(namedtuple("Period", "kind year index")):
+    """A calendar month, quarter or year; ``index`` is 1-based (0 for years)."""
+
+    KINDS = ("month", "quarter", "year")
+
+    @classmethod
+    def containing(cls, kind, day):
+        if kind == "month":
+            return cls(kind, day.year, day.month)
+        if kind == "quarter":
+            return cls(kind, day.year, (day.month - 1) // 3 + 1)
+        return cls("year", day.year, 0)
+
+    def _first_month(self):
+        return {"month": self.index, "quarter": 3 * self.index - 2}.get(self.kind, 1)
+
+    def _length(self):
+        return {"month": 1, "quarter": 3}.get(self.kind, 12)
+
+    def months(self):
+        """Month keys ("YYYY-MM") the period covers."""
+        first = self.year * 12 + self._first_month() - 1
+        return [
+            f"{(first + i) // 12:04d}-{(first + i) % 12 + 1:02d}"
+            for i in range(self._length())
+        ]
+
+    def bounds(self):
+        first, last = self.months()[0], self.months()[-1]
+        start, _ = month_bounds(*(int(p) for p in first.split("-")))
+        _, end = month_bounds(*(int(p) for p in last.split("-")))
+        return start, end
+
+    def shift(self, n):
+        start, _ = self.bounds()
+        first = start.year * 12 + start.month - 1 + n * self._length()
+        return Period.containing(self.kind, date(first // 12, first % 12 + 1, 1))
+
+    def label(self):
+        if self.kind == "month":
+            return date(self.year, self.index, 1).strftime("%B %Y")
+        if self.kind == "quarter":
+            return f"Q{self.index} {self.year}"
+        return str(self.year)
+
+
+def memory_report(store, pager=None, widgets=0, render=None):
+    """Resident-set figures used to tune the low-memory caps."""
+    report = {
+        "resident_rows": len(store.expenses),
+        "resident_months": None,
+        "evictions": 0,
+        "history_cards": widgets,
+        "rss_mb": None,
+        "redraws_coalesced": render.coalesced if render is not None else 0,
+    }
+    if pager is not None:
+        report["resident_months"] = len(pager.pinned) + len(pager.lru)
+        report["evictions"] = pager.evictions
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        report["rss_mb"] = pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    return report
+
+
+# ---------- Ledgers ---------- #
+
+LEDGER_DIR = "ledgers"          # ledgers/<name>/ holds each extra ledger
+DEFAULT_LEDGER = "Main"         # the base directory itself
+
+# what a ledger directory holds, by the module name use_ledger() rebinds
+LEDGER_FILES = {
+    "DATA_FILE": DATA_FILE,
+    "SHARD_DIR": SHARD_DIR,
+    "BUDGETS_FILE": BUDGETS_FILE,
+    "AGGREGATES_FILE": AGGREGATES_FILE,
+    "RECURRING_FILE": RECURRING_FILE,
+    "LIMITS_FILE": LIMITS_FILE,
+    "REPORT_DIR": REPORT_DIR,
+    "RECEIPT_DIR": RECEIPT_DIR,
+    "SYNC_STATE_FILE": SYNC_STATE_FILE,
+}
+_LEDGER_LOCKS = {}  # ledger directory -> (read lock, write lock)
+
+
+def ledger_file(root, name):
+    """Path of a ledger file (a LEDGER_FILES name) in directory ``root``."""
+    return os.path.join(root, LEDGER_FILES[name])
+
+
+def use_ledger(root):
+    """Point the file helpers and ledger locks at the ledger in ``root``.
+
+    The paths become absolute, so nothing depends on the working
+    directory, and each ledger has its own locks: a thread still busy
+    with the previous ledger keeps that ledger's lock, not the new one.
+    """
+    global DATA_FILE, SHARD_DIR, BUDGETS_FILE, AGGREGATES_FILE, RECURRING_FILE
+    global LIMITS_FILE, REPORT_DIR, RECEIPT_DIR, SYNC_STATE_FILE
+    global READ_LOCK, WRITE_LOCK
+    root = os.path.abspath(root)
+    if not _LEDGER_LOCKS:
+        # the import-time pair has relative paths: the working directory's
+        _LEDGER_LOCKS[os.path.abspath(".")] = (READ_LOCK, WRITE_LOCK)
+    DATA_FILE = ledger_file(root, "DATA_FILE")
+    SHARD_DIR = ledger_file(root, "SHARD_DIR")
+    BUDGETS_FILE = ledger_file(root, "BUDGETS_FILE")
+    AGGREGATES_FILE = ledger_file(root, "AGGREGATES_FILE")
+    RECURRING_FILE = ledger_file(root, "RECURRING_FILE")
+    LIMITS_FILE = ledger_file(root, "LIMITS_FILE")
+    REPORT_DIR = ledger_file(root, "REPORT_DIR")
+    RECEIPT_DIR = ledger_file(root, "RECEIPT_DIR")
+    SYNC_STATE_FILE = ledger_file(root, "SYNC_STATE_FILE")
+    locks = _LEDGER_LOCKS.get(root)
+    if locks is None:
+        locks = _LEDGER_LOCKS[root] = (
+            LedgerLock(os.path.join(root, READ_LOCK_FILE)),
+            LedgerLock(os.path.join(root, WRITE_LOCK_FILE)),
+        )
+    READ_LOCK, WRITE_LOCK = locks
+    return root
+
+
+class LedgerSet:
+    """Named ledgers under one base directory.
+
+    The default ledger is the base directory itself (the layout from
+    before there were several); the others live in ledgers/<name>/.
+    Activating one points the file helpers at its absolute paths and
+    its own locks (``use_ledger``); the working directory never changes.
+    """
+
+    def __init__(self, base=None):
+        self.base = os.path.abspath(base or os.getcwd())
+        self.active = DEFAULT_LEDGER
+
+    def path(self, name):
+        if name == DEFAULT_LEDGER:
+            return self.base
+        return os.path.join(self.base, LEDGER_DIR, name)
+
+    def names(self):
+        root = os.path.join(self.base, LEDGER_DIR)
+        extra = []
+        if os.path.isdir(root):
+            extra = sorted(
+                n for n in os.listdir(root) if os.path.isdir(os.path.join(root, n))
+            )
+        return [DEFAULT_LEDGER] + [n for n in extra if n != DEFAULT_LEDGER]
+
+    def activate(self, name):
+        name = " ".join(str(name).split())
+        if not name or name in (".", "..") or "/" in name or os.sep in name:
+            raise ValueError(f"bad ledger name: {name!r}")
+        os.makedirs(self.path(name), exist_ok=True)
+        use_ledger(self.path(name))
+        self.active = name
+        return name
+
+
+def _ledger_generation(root):
+    """Commit counter of a ledger directory, reading as little as possible."""
+    if os.path.isdir(ledger_file(root, "SHARD_DIR")):
+        try:
+            with open(ledger_file(root, "BUDGETS_FILE"), "r", encoding="utf-8") as f:
+                return json.load(f).get("generation", 0)
+        except Exception:
+            return 0
+    try:
+        with open(ledger_file(root, "DATA_FILE"), "rb") as f:
+            if f.readline().rstrip(b"\r\n") == SEGMENT_MAGIC:
+                meta = _check_segment(f.readline())  # meta is always first
+                if meta is not None and meta[0] == b"meta":
+                    return json.loads(meta[1]).get("generation", 0)
+                return None
+            f.seek(0)
+            data = json.load(f)
+            return data.get("generation", 0) if isinstance(data, dict) else 0
+    except Exception:
+        return 0
+
+
+def ledger_cube(root):
+    """MonthCube for a ledger directory that is not open in memory.
+
+    Uses its persisted aggregates when they are current; otherwise the
+    totals are rebuilt from its shards or its single file.
+    """
+    generation = _ledger_generation(root)
+    try:
+        with open(ledger_file(root, "AGGREGATES_FILE"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if (generation is not None and data.get("generation") == generation
+                and data.get("rates", "") == RATES.stamp):
+            return MonthCube(data["months"], generation, data.get("tags", {}))
+    except Exception:
+        pass
+
+    cube = MonthCube(generation=generation)
+    shard_dir = ledger_file(root, "SHARD_DIR")
+    if os.path.isdir(shard_dir):
+        for name in sorted(os.listdir(shard_dir)):
+            if name.endswith(".json"):
+                for exp in _read_shard(os.path.join(shard_dir, name)):
+                    cube.add(exp)
+        return cube
+    path = ledger_file(root, "DATA_FILE")
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return cube
+    for exp in read_ledger_file(f, path)["expenses"]:
+        cube.add(exp)
+    return cube
+
+
+# ---------- Forecast ---------- #
+
+Forecast = namedtuple(
+    "Forecast", "spent daily_rate projected safe_per_day days_left category_rates"
+)
+
+
+class BurnRateForecast:
+    """Exponentially weighted daily burn rate per category, per month.
+
+    Each expense contributes ``paise * DECAY ** -(day - 1)`` to its
+    month/category sum, i.e. a weight relative to the 1st of the month.
+    Adding or removing a row is therefore one multiply-add, and the
+    rate "as of" any day is that sum rescaled by ``DECAY ** (day - 1)``
+    and divided by the geometric sum of the weights seen so far.
+    """
+
+    HALF_LIFE_DAYS = 7
+    DECAY = 0.5 ** (1 / HALF_LIFE_DAYS)
+
+    def __init__(self):
+        self._weighted = {}  # month -> {cid: decayed sum}
+        self._spent = {}     # month -> {cid: plain sum}
+
+    def _key(self, exp):
+        try:
+            d = datetime.strptime(exp.get("date", ""), "%d-%m-%Y")
+        except (TypeError, ValueError):
+            return None
+        amt = base_paise(exp)
+        cid = CATEGORIES.intern(exp.get("category", "Other"))
+        return f"{d.year:04d}-{d.month:02d}", d.day, cid, amt
+
+    def _apply(self, exp, sign):
+        key = self._key(exp)
+        if key is None:
+            return
+        month, day, cid, amt = key
+        weighted = self._weighted.setdefault(month, {})
+        spent = self._spent.setdefault(month, {})
+        weighted[cid] = weighted.get(cid, 0.0) + sign * amt * self.DECAY ** (1 - day)
+        spent[cid] = spent.get(cid, 0) + sign * amt
+
+    def add(self, exp):
+        self._apply(exp, 1)
+
+    def remove(self, exp):
+        self._apply(exp, -1)
+
+    def forecast(self, budget=None, today=None, recurring_spent=0, upcoming=0):
+        """Month-end outlook as of ``today``.
+
+        ``recurring_spent`` / ``upcoming`` are recurring occurrences up to
+        and after today; they are known amounts, not part of the rate.
+        """
+        today = today or date.today()
+        month = today.strftime("%Y-%m")
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        elapsed = today.day
+        days_left = days_in_month - elapsed
+
+        scale = self.DECAY ** (elapsed - 1)
+        norm = (1 - self.DECAY ** elapsed) / (1 - self.DECAY)
+        rates = {
+            CATEGORIES.name(cid): max(w * scale / norm, 0.0)
+            for cid, w in self._weighted.get(month, {}).items()
+        }
+        rates = {cat: r for cat, r in rates.items() if r >= 0.5}
+        spent = sum(self._spent.get(month, {}).values()) + recurring_spent
+        daily_rate = sum(rates.values())
+        projected = spent + upcoming + int(round(daily_rate * days_left))
+
+        safe = None
+        if budget is not None:
+            safe = max(budget - spent - upcoming, 0) // (days_left + 1)
+        return Forecast(spent, daily_rate, projected, safe, days_left, rates)
+
+
+# ---------- Anomalies ---------- #
+
+Anomaly = namedtuple("Anomaly", "category paise typical z weekday")
+
+
+class RunningStats:
+    """Welford running mean/variance; push and pop are both O(1)."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def push(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def pop(self, x):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old = self.mean
+        self.n -= 1
+        self.mean = (old * (self.n + 1) - x) / self.n
+        self.m2 = max(self.m2 - (x - old) * (x - self.mean), 0.0)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class AnomalyDetector:
+    """Per-category and per-(category, weekday) expense statistics.
+
+    A store index: every insert or delete updates two RunningStats, so
+    the cost does not grow with history. ``check`` scores a new row
+    against them before it is added.
+    """
+
+    MIN_SAMPLES = 5     # fewer than this and nothing is "unusual" yet
+    Z_LIMIT = 3.0
+
+    def __init__(self):
+        self._by_cat = {}      # cid -> RunningStats
+        self._by_weekday = {}  # (cid, weekday) -> RunningStats
+
+    def _keys(self, exp):
+        try:
+            d = datetime.strptime(exp.get("date", ""), "%d-%m-%Y")
+        except (TypeError, ValueError):
+            return None
+        cid = CATEGORIES.intern(exp.get("category", "Other"))
+        return cid, (cid, d.weekday()), base_paise(exp)
+
+    def add(self, exp):
+        keys = self._keys(exp)
+        if keys is None:
+            return
+        cid, wkey, paise = keys
+        self._by_cat.setdefault(cid, RunningStats()).push(paise)
+        self._by_weekday.setdefault(wkey, RunningStats()).push(paise)
+
+    def remove(self, exp):
+        keys = self._keys(exp)
+        if keys is None:
+            return
+        cid, wkey, paise = keys
+        for table, key in ((self._by_cat, cid), (self._by_weekday, wkey)):
+            stats = table.get(key)
+            if stats is not None:
+                stats.pop(paise)
+                if not stats.n:
+                    del table[key]
+
+    def _z(self, stats, paise):
+        if stats is None or stats.n < self.MIN_SAMPLES:
+            return None
+        # identical past amounts give std 0; don't flag a rupee more
+        spread = max(stats.std(), 0.1 * stats.mean, 100)
+        return (paise - stats.mean) / spread
+
+    def check(self, exp):
+        """An Anomaly if ``exp`` is far above its usual amount, else None."""
+        keys = self._keys(exp)
+        if keys is None:
+            return None
+        cid, wkey, paise = keys
+        found = None
+        for stats, weekday in (
+            (self._by_cat.get(cid), None),
+            (self._by_weekday.get(wkey), wkey[1]),
+        ):
+            z = self._z(stats, paise)
+            if z is not None and z >= self.Z_LIMIT and (found is None or z > found.z):
+                found = Anomaly(
+                    CATEGORIES.name(cid), paise, int(round(stats.mean)), z, weekday
+                )
+        return found
+
+
+# ---------- Recurring expenses ---------- #
+
+RECURRING_FREQS = ("daily", "weekly", "monthly", "custom")  # custom = every N days
+
+
+def _parse_day(dstr):
+    return datetime.strptime(dstr, "%d-%m-%Y").date()
+
+
+def _add_months(d, n, day):
+    y, m = divmod(d.month - 1 + n, 12)
+    y += d.year
+    m += 1
+    return date(y, m, min(day, calendar.monthrange(y, m)[1]))
+
+
+def rule_dates(rule, start, end):
+    """Occurrences of ``rule`` within [start, end], generated on demand."""
+    first = _parse_day(rule["start"])
+    until = _parse_day(rule["until"]) if rule.get("until") else None
+    lo = max(start, first)
+    hi = min(end, until) if until else end
+    if hi < lo:
+        return
+
+    interval = max(1, int(rule.get("interval", 1)))
+    if rule["freq"] == "monthly":
+        k = max(0, (lo.year - first.year) * 12 + lo.month - first.month - 1)
+        k -= k % interval
+        while True:
+            d = _add_months(first, k, first.day)
+            if d > hi:
+                return
+            if d >= lo:
+                yield d
+            k += interval
+
+    step = interval * (7 if rule["freq"] == "weekly" else 1)
+    k = -(-(lo - first).days // step)  # ceil
+    d = first + timedelta(days=k * step)
+    while d <= hi:
+        yield d
+        d += timedelta(days=step)
+
+
+def rule_count(rule, start, end):
+    """Number of occurrences in [start, end] without listing them."""
+    if rule["freq"] == "monthly":
+        return sum(1 for _ in rule_dates(rule, start, end))
+    first = _parse_day(rule["start"])
+    until = _parse_day(rule["until"]) if rule.get("until") else None
+    lo = max(start, first)
+    hi = min(end, until) if until else end
+    if hi < lo:
+        return 0
+    step = max(1, int(rule.get("interval", 1)))
+    step *= 7 if rule["freq"] == "weekly" else 1
+    k_lo = -(-(lo - first).days // step)
+    k_hi = (hi - first).days // step
+    return max(0, k_hi - k_lo + 1)
+
+
+def virtual_row(rule, d):
+    """An expense-shaped row for one occurrence (never persisted)."""
+    row = {
+        "id": f"{rule['id']}@{d.isoformat()}",
+        "paise": rule["paise"],
+        "category": rule["category"],
+        "note": rule.get("note", ""),
+        "date": d.strftime("%d-%m-%Y"),
+        "created_at": d.strftime("%Y-%m-%d 00:00:00"),
+        "recurring": rule["id"],
+    }
+    if rule.get("currency", BASE_CURRENCY) != BASE_CURRENCY:
+        row["currency"] = rule["currency"]
+    if rule.get("tags"):
+        row["tags"] = rule["tags"]
+    return row
+
+
+class RecurringRules:
+    """Recurring expense rules, expanded lazily per requested date range.
+
+    Nothing is written to the ledger: month totals multiply an
+    occurrence count by the rule amount, and views ask for virtual rows
+    only over the range they show.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else []
+        self.version = 0
+
+    @classmethod
+    def load(cls, path=None):
+        rules = cls()
+        rules.reload(path)
+        return rules
+
+    def reload(self, path=None):
+        path = path or RECURRING_FILE
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rules = json.load(f)
+        except Exception:
+            rules = []
+        self.rules = rules if isinstance(rules, list) else []
+        self.version += 1
+
+    def save(self):
+        with WRITE_LOCK.hold():
+            try:
+                _commit_staged([_stage_json(RECURRING_FILE, self.rules)])
+            except Exception as e:
+                print("Error saving recurring rules:", e)
+
+    def add(self, paise, category, note, start, freq, interval=1,
+            currency=BASE_CURRENCY, tags=()):
+        if freq not in RECURRING_FREQS:
+            raise ValueError(f"unknown frequency: {freq}")
+        rule = {
+            "id": uuid.uuid4().hex,
+            "paise": paise,
+            "category": CATEGORIES.canonical(category),
+            "note": note,
+            "start": start,
+            "freq": freq,
+            "interval": max(1, int(interval)),
+        }
+        if currency != BASE_CURRENCY:
+            rule["currency"] = currency
+        if tags:
+            rule["tags"] = normalize_tags(tags)
+        self.rules.append(rule)
+        self.version += 1
+        return rule
+
+    def stop(self, rule_id, until=None):
+        """End a rule after ``until`` (today by default); keeps its past."""
+        until = until or date.today()
+        for rule in self.rules:
+            if rule["id"] == rule_id:
+                rule["until"] = until.strftime("%d-%m-%Y")
+        self.version += 1
+
+    def active(self, on=None):
+        on = on or date.today()
+        return [
+            r for r in self.rules
+            if not r.get("until") or _parse_day(r["until"]) >= on
+        ]
+
+    def first_start(self):
+        starts = [_parse_day(r["start"]) for r in self.rules]
+        return min(starts) if starts else None
+
+    def rows(self, start, end):
+        """Virtual occurrences in [start, end], oldest first."""
+        out = []
+        for rule in self.rules:
+            out.extend(virtual_row(rule, d) for d in rule_dates(rule, start, end))
+        out.sort(key=lambda e: e["created_at"])
+        return out
+
+    @staticmethod
+    def _spend(rule, start, end):
+        if rule.get("currency", BASE_CURRENCY) != BASE_CURRENCY:
+            # each occurrence converts at its own day's rate
+            days = [virtual_row(rule, d) for d in rule_dates(rule, start, end)]
+            return sum(RATES.convert_rows(days))
+        return rule_count(rule, start, end) * rule["paise"]
+
+    def totals(self, start, end):
+        """{category: paise} over [start, end] from occurrence counts."""
+        per_cat = {}
+        for rule in self.rules:
+            value = self._spend(rule, start, end)
+            if value:
+                cat = CATEGORIES.canonical(rule["category"])
+                per_cat[cat] = per_cat.get(cat, 0) + value
+        return per_cat
+
+    def tag_totals(self, start, end):
+        per_tag = {}
+        for rule in self.rules:
+            if rule.get("tags"):
+                value = self._spend(rule, start, end)
+                for tag in rule["tags"]:
+                    per_tag[tag] = per_tag.get(tag, 0) + value
+        return {t: v for t, v in per_tag.items() if v}
+
+
+# ---------- Category budgets ---------- #
+
+LIMIT_LEVELS = (None, "warn", "alert")
+
+
+class CategoryBudgets:
+    """Standing monthly limits per category, with warn/alert thresholds.
+
+    ``limits[category]`` is {"paise", "warn", "alert"}, thresholds in
+    percent of the limit. Checking one insert is a single dict lookup
+    against a total the month cube already maintains.
+    """
+
+    WARN_PCT = 80
+    ALERT_PCT = 100
+
+    def __init__(self, limits=None):
+        self.limits = limits if limits is not None else {}
+
+    @classmethod
+    def load(cls):
+        limits = cls()
+        limits.reload()
+        return limits
+
+    def reload(self):
+        try:
+            with open(LIMITS_FILE, "r", encoding="utf-8") as f:
+                limits = json.load(f)
+        except Exception:
+            limits = {}
+        self.limits = limits if isinstance(limits, dict) else {}
+
+    def save(self):
+        with WRITE_LOCK.hold():
+            try:
+                _commit_staged([_stage_json(LIMITS_FILE, self.limits)])
+            except Exception as e:
+                print("Error saving category budgets:", e)
+
+    def set(self, category, paise, warn=WARN_PCT, alert=ALERT_PCT):
+        self.limits[CATEGORIES.canonical(category)] = {
+            "paise": paise,
+            "warn": warn,
+            "alert": alert,
+        }
+
+    def remove(self, category):
+        self.limits.pop(CATEGORIES.canonical(category), None)
+
+    def level(self, category, spent):
+        """None, "warn" or "alert" for ``spent`` paise in ``category``."""
+        limit = self.limits.get(category)
+        if limit is None:
+            return None
+        if spent * 100 >= limit["paise"] * limit["alert"]:
+            return "alert"
+        if spent * 100 >= limit["paise"] * limit["warn"]:
+            return "warn"
+        return None
+
+    def crossed(self, category, before, after):
+        """The level reached if going from ``before`` to ``after`` raised it."""
+        old, new = self.level(category, before), self.level(category, after)
+        if LIMIT_LEVELS.index(new) > LIMIT_LEVELS.index(old):
+            return new
+        return None
+
+    def status(self, per_cat):
+        """[(category, spent, limit paise, level)] for every limit set."""
+        out = []
+        for cat, limit in sorted(self.limits.items()):
+            spent = per_cat.get(cat, 0)
+            out.append((cat, spent, limit["paise"], self.level(cat, spent)))
+        return out
+
+
+# ---------- Queries ---------- #
+
+QUERY_CACHE_SIZE = 32  # compiled filters (and their results) kept
+QUERY_FIELDS = {
+    "category": "category", "cat": "category", "tag": "tag", "note": "note",
+    "text": "text", "date": "date", "amount": "amount",
+}
+QUERY_OPS = {
+    ":": operator.eq, "=": operator.eq,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+_QUERY_TERM = re.compile(r"(\w+)(<=|>=|[:~<>=])(.*)\Z", re.S)
+
+Clause = namedtuple("Clause", "field op value negate")
+
+
+def _words(text):
+    return re.findall(r"\w+", str(text).casefold())
+
+
+def _row_text(exp):
+    parts = [exp.get("note") or "", exp.get("category", "Other")]
+    parts.extend(exp.get("tags", ()))
+    return " ".join(parts)
+
+
+class RowIndex:
+    """Resident rows by month, category node, tag and word.
+
+    Each posting is a set of record keys, so a query can start from the
+    rows an index names instead of scanning. Paging rows in or out
+    updates it like any other change, so it only covers loaded rows.
+    """
+
+    def __init__(self):
+        self.rows = {}      # key -> row
+        self.by_month = {}  # "YYYY-MM" -> keys
+        self.by_node = {}   # category_key of the category and each parent -> keys
+        self.by_tag = {}
+        self.by_word = {}   # word of the note, category or tags -> keys
+
+    def _postings(self, exp):
+        yield self.by_month, shard_month(exp)
+        for node in CATEGORIES.ancestors(exp.get("category", "Other")):
+            yield self.by_node, category_key(node)
+        for tag in exp.get("tags", ()):
+            yield self.by_tag, tag
+        for word in set(_words(_row_text(exp))):
+            yield self.by_word, word
+
+    def add(self, exp):
+        key = record_key(exp)
+        self.rows[key] = exp
+        for table, value in self._postings(exp):
+            table.setdefault(value, set()).add(key)
+
+    def remove(self, exp):
+        key = record_key(exp)
+        self.rows.pop(key, None)
+        for table, value in self._postings(exp):
+            keys = table.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del table[value]
+
+    def months_between(self, first, last):
+        keys = set()
+        for month, posting in self.by_month.items():
+            if first <= month <= last:
+                keys |= posting
+        return keys
+
+    def words_containing(self, needle):
+        keys = set()
+        for word, posting in self.by_word.items():
+            if needle in word:
+                keys |= posting
+        return keys
+
+
+def parse_query(text):
+    """Clauses of a filter like ``category:food amount>500 note~"uber"``.
+
+    Bare words search the note, category and tags; ``#trip`` is short
+    for ``tag:trip`` and a leading ``-`` negates a term.
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f"Could not read the filter: {e}.")
+    clauses = []
+    for token in tokens:
+        negate = token.startswith("-") and len(token) > 1
+        if negate:
+            token = token[1:]
+        m = _QUERY_TERM.match(token)
+        if m and m.group(1).casefold() in QUERY_FIELDS:
+            field, op, value = QUERY_FIELDS[m.group(1).casefold()], m.group(2), m.group(3)
+        elif token.startswith("#"):
+            field, op, value = "tag", ":", token[1:]
+        else:
+            field, op, value = "text", "~", token
+        if not value.strip():
+            raise ValueError(f"'{token}' needs a value.")
+        clauses.append(Clause(field, op, value.strip(), negate))
+    return clauses
+
+
+def _query_bounds(text):
+    """First and last day of "2025", "2025-10", "2025-10-05" or "05-10-2025"."""
+    parts = text.split("-")
+    try:
+        if len(parts) == 1:
+            year = int(parts[0])
+            return date(year, 1, 1), date(year, 12, 31)
+        if len(parts) == 2:
+            return month_bounds(int(parts[0]), int(parts[1]))
+        day = date(*map(int, parts)) if len(parts[0]) == 4 else _parse_day(text)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{text}' is not a date, month or year.")
+    return day, day
+
+
+def _month_key(d):
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _row_day(exp):
+    try:
+        return _parse_day(exp.get("date", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _compile_category(op, value):
+    key = category_key(value)
+    prefix = key + CATEGORY_SEP
+
+    def test(exp):
+        cat = category_key(CATEGORIES.canonical(exp.get("category", "Other")))
+        return cat == key or cat.startswith(prefix)
+
+    return test, lambda index: index.by_node.get(key, set())
+
+
+def _compile_tag(op, value):
+    tags = normalize_tags([value])
+    tag = tags[0] if tags else value
+    return (
+        lambda exp: tag in exp.get("tags", ()),
+        lambda index: index.by_tag.get(tag, set()),
+    )
+
+
+def _compile_text(field, op, value):
+    needle = value.casefold()
+    if field == "note":
+        def test(exp):
+            return needle in (exp.get("note") or "").casefold()
+    else:
+        def test(exp):
+            return needle in _row_text(exp).casefold()
+
+    # every word of the needle lies inside some indexed word of a match
+    words = _words(needle)
+    if not words:
+        return test, None
+
+    def probe(index):
+        postings = sorted((index.words_containing(w) for w in words), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    return test, probe
+
+
+def _compile_amount(op, value):
+    try:
+        paise = to_paise(value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not an amount.")
+    compare = QUERY_OPS[op]
+    return lambda exp: compare(base_paise(exp), paise), None
+
+
+def _compile_date(op, value):
+    first_text, dots, last_text = value.partition("..")
+    if dots and op not in (":", "="):
+        raise ValueError(f"Use date:{value} for a range.")
+    first = _query_bounds(first_text)[0] if first_text else date.min
+    last = date.max
+    if last_text or not dots:
+        last = _query_bounds(last_text or first_text)[1]
+    if op == ">":
+        # nothing lies after date.max: an empty range rather than overflow
+        if last == date.max:
+            first, last = date.max, date.min
+        else:
+            first, last = last + timedelta(days=1), date.max
+    elif op == ">=":
+        last = date.max
+    elif op == "<":
+        if first == date.min:
+            first, last = date.max, date.min
+        else:
+            first, last = date.min, first - timedelta(days=1)
+    elif op == "<=":
+        first = date.min
+
+    def test(exp):
+        day = _row_day(exp)
+        return day is not None and first <= day <= last
+
+    months = (_month_key(first), _month_key(last))
+    return test, lambda index: index.months_between(*months)
+
+
+_QUERY_COMPILERS = {
+    "category": (":=", _compile_category),
+    "tag": (":=", _compile_tag),
+    "note": (":~=", lambda op, value: _compile_text("note", op, value)),
+    "text": (":~=", lambda op, value: _compile_text("text", op, value)),
+    "amount": (":=<>", _compile_amount),
+    "date": (":=<>", _compile_date),
+}
+
+
+class CompiledQuery:
+    """A parsed filter: one test per clause plus the index probes.
+
+    ``run`` intersects the probes' postings (smallest first) and tests
+    only those rows; with no usable probe it falls back to a scan.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tests, self.probes, self.plan = [], [], []
+        for clause in parse_query(text):
+            ops, compile_clause = _QUERY_COMPILERS[clause.field]
+            if clause.op[0] not in ops:
+                raise ValueError(f"'{clause.field}' cannot be used with '{clause.op}'.")
+            test, probe = compile_clause(clause.op, clause.value)
+            if clause.negate:
+                test, probe = (lambda exp, t=test: not t(exp)), None
+            self.tests.append(test)
+            if probe is not None:
+                self.probes.append(probe)
+                self.plan.append(clause.field)
+
+    def match(self, exp):
+        return all(test(exp) for test in self.tests)
+
+    def run(self, rows, index=None, extra=()):
+        """Matching rows (plus matching ``extra`` ones), oldest first."""
+        if index is not None and self.probes:
+            postings = sorted((probe(index) for probe in self.probes), key=len)
+            keys = postings[0].intersection(*postings[1:])
+            rows = [index.rows[key] for key in keys]
+        out = [exp for exp in rows if self.match(exp)]
+        out.extend(exp for exp in extra if self.match(exp))
+        out.sort(key=lambda e: (e.get("created_at") or "", record_key(e)))
+        return out
+
+
+class QueryCache:
+    """LRU of compiled filters and their last result.
+
+    A result is reused while the data version it was computed for is
+    current; any change to the ledger bumps the version and the next
+    lookup re-runs the (still compiled) query.
+    """
+
+    def __init__(self, capacity=QUERY_CACHE_SIZE):
+        self.capacity = capacity
+        self.lru = OrderedDict()  # text -> [CompiledQuery, version, rows]
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, text):
+        entry = self.lru.get(text)
+        if entry is None:
+            entry = self.lru[text] = [CompiledQuery(text), None, None]
+            while len(self.lru) > self.capacity:
+                self.lru.popitem(last=False)
+        self.lru.move_to_end(text)
+        return entry
+
+    def get(self, text, version, run):
+        """Rows for ``text`` at ``version``; ``run(query)`` on a miss."""
+        entry = self.compile(text)
+        if entry[1] == version:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry[1], entry[2] = version, run(entry[0])
+        return entry[2]
+
+
+# ---------- Receipts ---------- #
+
+def _make_thumbnail(src, dest, size=THUMB_SIZE):
+    """Cached PNG thumbnail of ``src``; None if Pillow is unavailable."""
+    if os.path.exists(dest):
+        return dest
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(src) as im:
+        im.thumbnail((size, size))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + ".tmp"
+        im.convert("RGB").save(tmp, "PNG")
+    os.replace(tmp, dest)
+    return dest
+
+
+class ReceiptStore:
+    """Receipt images kept once each under their content hash.
+
+    Rows only carry the key ("<sha256>.jpg"), so the ledger stays small
+    and a photo attached twice is stored once. Thumbnails are made on a
+    worker thread and cached under ``thumbs/``.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or RECEIPT_DIR
+        self._pool = None
+        self._jobs = {}  # thumbnail path -> Future
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def thumb_path(self, key):
+        name = os.path.splitext(key)[0] + ".png"
+        return os.path.join(self.root, "thumbs", name)
+
+    def add(self, src):
+        """Copy ``src`` in unless an identical image is already stored."""
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        key = digest.hexdigest() + os.path.splitext(src)[1].lower()
+        dest = self.path(key)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(src, dest + ".tmp")
+            os.replace(dest + ".tmp", dest)
+        return key
+
+    def thumbnail(self, key):
+        """Future for the thumbnail path, made at most once per key."""
+        # absolute for the worker, whatever directory it runs in
+        dest = os.path.abspath(self.thumb_path(key))
+        job = self._jobs.get(dest)
+        if job is None:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._pool = ThreadPoolExecutor(max_workers=1)
+            src = os.path.abspath(self.path(key))
+            job = self._jobs[dest] = self._pool.submit(_make_thumbnail, src, dest)
+        return job
+
+
+# ---------- Reports ---------- #
+
+REPORT_CSS = """
+body { background: #020617; color: #e5e7eb; font-family: Inter, sans-serif;
+       max-width: 760px; margin: 24px auto; padding: 0 16px; }
+h1 { font-size: 22px; margin-bottom: 4px; }
+.sub { color: #9ca3af; font-size: 13px; }
+.card { background: #0b1120; border: 1px solid #1f2937; border-radius: 14px;
+        padding: 14px 16px; margin: 16px 0; }
+table { width: 100%; border-collapse: collapse; font-size: 13px; }
+td, th { padding: 6px 4px; border-bottom: 1px solid #1f2937; text-align: left; }
+td.num, th.num { text-align: right; }
+.advice { color: #f97316; }
+"""
+
+
+def summarize_month(month, rows, budget=None, advice=""):
+    """Plain, picklable numbers for one month's report."""
+    y, m = (int(part) for part in month.split("-"))
+    days = [0] * calendar.monthrange(y, m)[1]
+    per_cat = {}
+    for exp, paise in zip(rows, RATES.convert_rows(rows)):
+        try:
+            day = datetime.strptime(exp.get("date", ""), "%d-%m-%Y").day
+        except (TypeError, ValueError):
+            continue
+        days[day - 1] += paise
+        cat = CATEGORIES.canonical(exp.get("category", "Other"))
+        per_cat[cat] = per_cat.get(cat, 0) + paise
+    cats = sorted(per_cat.items(), key=lambda kv: -kv[1])
+    return {
+        "month": month,
+        "title": date(y, m, 1).strftime("%B %Y"),
+        "spent": sum(days),
+        "budget": budget,
+        "days": days,
+        "categories": [(c, v, CATEGORIES.style(c).color) for c, v in cats],
+        "count": len(rows),
+        "advice": advice,
+    }
+
+
+def _svg_daily(days, width=720, height=180):
+    peak = max(days) or 1
+    slot = width / len(days)
+    bars = []
+    for i, paise in enumerate(days):
+        h = (height - 20) * paise / peak
+        bars.append(
+            f'<rect x="{i * slot + 1:.1f}" y="{height - 16 - h:.1f}" '
+            f'width="{slot - 2:.1f}" height="{h:.1f}" rx="2" fill="#38bdf8">'
+            f"<title>Day {i + 1}: {html.escape(format_money(paise))}</title></rect>"
+        )
+        if i % 5 == 0:
+            bars.append(
+                f'<text x="{i * slot + slot / 2:.1f}" y="{height - 2}" '
+                f'font-size="10" fill="#9ca3af" text-anchor="middle">{i + 1}</text>'
+            )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="100%" '
+        f'viewBox="0 0 {width} {height}">{"".join(bars)}</svg>'
+    )
+
+
+def _svg_categories(categories, width=720, row=24):
+    if not categories:
+        return ""
+    peak = categories[0][1] or 1
+    label_w = 160
+    parts = []
+    for i, (cat, paise, color) in enumerate(categories):
+        y = i * row
+        w = max(0, (width - label_w - 90) * paise / peak)
+        parts.append(
+            f'<text x="0" y="{y + 16}" font-size="12" fill="#e5e7eb">'
+            f"{html.escape(cat)}</text>"
+            f'<rect x="{label_w}" y="{y + 4}" width="{w:.1f}" height="{row - 8}" '
+            f'rx="4" fill="{color}"/>'
+            f'<text x="{label_w + w + 6:.1f}" y="{y + 16}" font-size="11" '
+            f'fill="#9ca3af">{html.escape(format_money(paise, 0))}</text>'
+        )
+    height = row * len(categories)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="100%" '
+        f'viewBox="0 0 {width} {height}">{"".join(parts)}</svg>'
+    )
+
+
+def render_report(summary):
+    """Self-contained HTML (inline CSS + SVG) for one month summary."""
+    spent, budget = summary["spent"], summary["budget"]
+    if budget is None:
+        status = "No budget set."
+    elif spent <= budget:
+        status = f"Under budget by {format_money(budget - spent)}"
+    else:
+        status = f"Over budget by {format_money(spent - budget)}"
+    if budget is not None:
+        status += f" (budget {format_money(budget)})."
+
+    rows = "".join(
+        f"<tr><td>{html.escape(cat)}</td>"
+        f'<td class="num">{html.escape(format_money(paise))}</td>'
+        f'<td class="num">{100 * paise / (spent or 1):.1f}%</td></tr>'
+        for cat, paise, _ in summary["categories"]
+    )
+    advice = ""
+    if summary["advice"]:
+        advice = f'<p class="advice">{html.escape(summary["advice"])}</p>'
+    title = html.escape(summary["title"])
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>SpendFlow · {title}</title>
+<style>{REPORT_CSS}</style></head><body>
+<h1>{title}</h1>
+<div class="sub">{summary["count"]} expenses · spent {html.escape(format_money(spent))}
+ · {html.escape(status)}</div>
+{advice}
+<div class="card"><h3>Daily spend</h3>{_svg_daily(summary["days"])}</div>
+<div class="card"><h3>By category</h3>{_svg_categories(summary["categories"])}</div>
+<div class="card"><table>
+<tr><th>Category</th><th class="num">Spent</th><th class="num">Share</th></tr>
+{rows}</table></div>
+</body></html>
+"""
+
+
+def write_report(summary):
+    """Render one summary to REPORT_DIR; returns the file path."""
+    path = os.path.join(REPORT_DIR, f"{summary['month']}.html")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_report(summary))
+    os.replace(tmp, path)
+    return path
+
+
+def generate_reports(months, rules=None, advice=None, notes=None):
+    """Write a report per month; safe to run off the Tk thread.
+
+    The rows are re-read from disk (so paged-out months work too) and
+    each month is summarised and rendered here, in the calling thread;
+    rendering is cheap string formatting, not worth another process.
+    ``advice(diff, cat_totals)`` supplies the text for months with a
+    budget; ``notes`` overrides it per month.
+    """
+    months = sorted(set(months))
+    doc = load_ledger(months=months)
+    by_month = {m: [] for m in months}
+    for exp in doc["expenses"]:
+        rows = by_month.get(shard_month(exp))
+        if rows is not None:
+            rows.append(exp)
+
+    summaries = []
+    for month in months:
+        rows = by_month[month]
+        if rules is not None:
+            y, m = (int(part) for part in month.split("-"))
+            start, end = month_bounds(y, m)
+            end = min(end, date.today())  # occurrences that happened
+            if start <= end:
+                rows = rows + rules.rows(start, end)
+        budget = doc["budgets"].get(month)
+        summary = summarize_month(month, rows, budget)
+        if notes and month in notes:
+            summary["advice"] = notes[month]
+        elif advice is not None and budget is not None:
+            per_cat = {c: v for c, v, _ in summary["categories"]}
+            summary["advice"] = advice(budget - summary["spent"], per_cat)
+        summaries.append(summary)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    return [write_report(summary) for summary in summaries]
+
+
+# ---------- Sync ---------- #
+
+SYNC_PORT = 8765
+SYNC_BATCH = 200                 # records per message
+SYNC_LINE_LIMIT = 16 * 1024 * 1024
+SYNC_FIELDS = ("rev", "device")  # version metadata carried by each row
+
+
+def _version(meta):
+    """Total order used to resolve conflicts: newer rev, then device id."""
+    return meta.get("rev", 0), meta.get("device", "")
+
+
+async def _send(writer, msg):
+    writer.write(json.dumps(msg).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def _recv(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("sync peer closed the connection")
+    return json.loads(line)
+
+
+class SyncPeer:
+    """One side of the delta sync between two SpendFlow ledgers.
+
+    Rows carry a Lamport ``rev`` and the ``device`` that wrote them;
+    deletions become tombstones with the same metadata. Every change
+    also gets a local sequence number, so a session only ships what
+    changed since the sequence the other device last acknowledged.
+    Conflicts keep the higher (rev, device) pair on both sides.
+
+    ``update(mutate)`` is the read-modify-write used on the ledger;
+    by default the locked ``update_ledger`` on the active ledger, whose
+    sync state file is also the default (``""`` keeps it in memory).
+    """
+
+    def __init__(self, state_file=None, update=update_ledger):
+        self.state_file = SYNC_STATE_FILE if state_file is None else state_file
+        self.update = update
+        self.state = self._load_state()
+        self._session_lock = None
+
+    @property
+    def device_id(self):
+        return self.state["device_id"]
+
+    def _load_state(self):
+        state = {}
+        if self.state_file and os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except Exception:
+                state = {}
+        state.setdefault("device_id", uuid.uuid4().hex)
+        for key, default in (("clock", 0), ("seq", 0)):
+            state.setdefault(key, default)
+        for key in ("peers", "seqs", "tombstones"):
+            state.setdefault(key, {})
+        return state
+
+    def _save_state(self):
+        if self.state_file:
+            tmp, path = _stage_json(self.state_file, self.state)
+            os.replace(tmp, path)
+
+    def _next_seq(self, key):
+        self.state["seq"] += 1
+        self.state["seqs"][key] = self.state["seq"]
+
+    def stamp(self, expenses):
+        """Version rows added and deleted locally since the last sync.
+
+        Returns the months whose rows gained version metadata.
+        """
+        st = self.state
+        months = set()
+        present = set()
+        for exp in expenses:
+            key = record_key(exp)
+            present.add(key)
+            if key in st["seqs"] and key not in st["tombstones"]:
+                continue
+            if "rev" not in exp:
+                st["clock"] += 1
+                exp["rev"], exp["device"] = st["clock"], self.device_id
+                months.add(shard_month(exp))
+            st["tombstones"].pop(key, None)
+            self._next_seq(key)
+
+        for key in list(st["seqs"]):
+            if key not in present and key not in st["tombstones"]:
+                st["clock"] += 1
+                st["tombstones"][key] = {"rev": st["clock"], "device": self.device_id}
+                self._next_seq(key)
+        return months
+
+    def changes_for(self, peer_id, expenses):
+        """(records, tombstones, watermark) the peer has not acknowledged."""
+        st = self.state
+        since = st["peers"].get(peer_id, 0)
+        seqs = st["seqs"]
+        records = [
+            exp for exp in expenses
+            if seqs.get(record_key(exp), 0) > since and exp.get("device") != peer_id
+        ]
+        tombstones = {
+            key: tomb for key, tomb in st["tombstones"].items()
+            if seqs.get(key, 0) > since and tomb.get("device") != peer_id
+        }
+        return records, tombstones, st["seq"]
+
+    def apply(self, expenses, records, tombstones):
+        """Merge a peer's delta into ``expenses``; returns touched months."""
+        normalize_rows(records)
+        st = self.state
+        local_tombs = st["tombstones"]
+        index = {record_key(e): i for i, e in enumerate(expenses)}
+        months = set()
+
+        for rec in records:
+            key = record_key(rec)
+            st["clock"] = max(st["clock"], rec.get("rev", 0))
+            tomb = local_tombs.get(key)
+            if tomb is not None and _version(tomb) >= _version(rec):
+                continue
+            i = index.get(key)
+            if i is None:
+                index[key] = len(expenses)
+                expenses.append(rec)
+            elif _version(expenses[i]) < _version(rec):
+                months.add(shard_month(expenses[i]))
+                expenses[i] = rec
+            else:
+                continue
+            rec["category"] = CATEGORIES.canonical(rec.get("category", "Other"))
+            local_tombs.pop(key, None)
+            months.add(shard_month(rec))
+            self._next_seq(key)
+
+        dropped = set()
+        for key, tomb in tombstones.items():
+            st["clock"] = max(st["clock"], tomb.get("rev", 0))
+            mine = local_tombs.get(key)
+            if mine is not None and _version(mine) >= _version(tomb):
+                continue
+            i = index.get(key)
+            if i is not None:
+                if _version(expenses[i]) > _version(tomb):
+                    continue
+                months.add(shard_month(expenses[i]))
+                dropped.add(key)
+            local_tombs[key] = tomb
+            self._next_seq(key)
+
+        if dropped:
+            expenses[:] = [e for e in expenses if record_key(e) not in dropped]
+        return months
+
+    async def run_session(self, reader, writer):
+        """Exchange deltas with the peer on the other end of the stream."""
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            return await self._session(reader, writer)
+
+    async def _session(self, reader, writer):
+        await _send(writer, {"type": "hello", "device": self.device_id})
+        hello = await _recv(reader)
+        peer_id = hello["device"]
+
+        outgoing = {}
+
+        def collect(expenses, budgets):
+            months = self.stamp(expenses)
+            outgoing["delta"] = self.changes_for(peer_id, expenses)
+            self._save_state()
+            return months
+
+        self.update(collect)
+        records, tombstones, watermark = outgoing["delta"]
+
+        async def send_all():
+            for i in range(0, len(records), SYNC_BATCH):
+                batch = records[i:i + SYNC_BATCH]
+                await _send(writer, {"type": "batch", "records": batch})
+            items = list(tombstones.items())
+            for i in range(0, len(items), SYNC_BATCH):
+                batch = dict(items[i:i + SYNC_BATCH])
+                await _send(writer, {"type": "batch", "tombstones": batch})
+            await _send(writer, {"type": "done"})
+
+        async def recv_all():
+            got_records, got_tombs = [], {}
+            while True:
+                msg = await _recv(reader)
+                if msg.get("type") == "done":
+                    return got_records, got_tombs
+                got_records.extend(msg.get("records", ()))
+                got_tombs.update(msg.get("tombstones", {}))
+
+        _, (in_records, in_tombs) = await asyncio.gather(send_all(), recv_all())
+
+        if in_records or in_tombs:
+            def merge(expenses, budgets):
+                months = self.stamp(expenses)  # local edits made meanwhile
+                months |= self.apply(expenses, in_records, in_tombs)
+                self._save_state()
+                return months
+
+            self.update(merge)
+
+        await _send(writer, {"type": "ack"})
+        if (await _recv(reader)).get("type") == "ack":
+            with WRITE_LOCK.hold():
+                self.state["peers"][peer_id] = watermark
+                self._save_state()
+
+        return {
+            "peer": peer_id,
+            "sent": len(records) + len(tombstones),
+            "received": len(in_records) + len(in_tombs),
+        }
+
+    async def serve(self, host="127.0.0.1", port=SYNC_PORT):
+        """Start a sync server (loopback by default); returns the server."""
+
+        async def handle(reader, writer):
+            try:
+                result = await self.run_session(reader, writer)
+                print(
+                    f"Synced with {result['peer'][:8]}: "
+                    f"sent {result['sent']}, received {result['received']}"
+                )
+            except (ConnectionError, ValueError) as e:
+                print("Sync session failed:", e)
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port, limit=SYNC_LINE_LIMIT)
+
+    async def sync_with(self, host="127.0.0.1", port=SYNC_PORT):
+        reader, writer = await asyncio.open_connection(
+            host, port, limit=SYNC_LINE_LIMIT
+        )
+        try:
+            return await self.run_session(reader, writer)
+        finally:
+            writer.close()
+
+
+async def _serve_forever(host, port):
+    server = await SyncPeer().serve(host, port)
+    print(f"Sync server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ---------- Rendering ---------- #
+
+class RenderScheduler:
+    """Coalesces redraw requests into one ``after_idle`` pass.
+
+    Parts register a draw function; ``mark`` flags them dirty and the
+    next idle pass computes the shared frame data once (``prepare``)
+    and redraws only what is dirty. A part may ``cover`` others, e.g.
+    the full history redraw also repaints its total. Requests that end
+    up sharing a redraw are counted in ``coalesced``.
+    """
+
+    def __init__(self, root, prepare=None):
+        self.root = root
+        self.prepare = prepare or (lambda: {})
+        self.parts = OrderedDict()  # name -> (draw, covered names)
+        self.dirty = set()
+        self.pending = False
+        self.requests = 0
+        self.coalesced = 0
+        self.passes = 0
+        self.redraws = 0
+
+    def register(self, name, draw, covers=()):
+        self.parts[name] = (draw, set(covers))
+
+    def mark(self, *names):
+        for name in names:
+            self.requests += 1
+            if name in self.dirty:
+                self.coalesced += 1
+            self.dirty.add(name)
+        if self.dirty and not self.pending:
+            self.pending = True
+            self.root.after_idle(self.flush)
+
+    def flush(self):
+        self.pending = False
+        dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return
+        for name in list(dirty):
+            covered = self.parts[name][1] & dirty
+            self.coalesced += len(covered)
+            dirty -= covered
+        frame = self.prepare()
+        self.passes += 1
+        for name, (draw, _) in self.parts.items():
+            if name in dirty:
+                draw(frame)
+                self.redraws += 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "passes": self.passes,
+            "redraws": self.redraws,
+        }
+
+
+# ---------- Charts ---------- #
+
+class BarChart:
+    """Category bar chart on a Tk canvas that scales to many categories.
+
+    Past ``top_n`` bars the smallest categories fold into one "Other"
+    bar. Bars sit at a fixed pitch on a horizontally scrollable canvas
+    and are only created once scrolled into view; ``update`` moves and
+    relabels the existing canvas items rather than recreating them.
+    """
+
+    PITCH = 64          # px per bar slot
+    MARGIN = 16
+    TOP = 40
+    LABEL_CHARS = 9
+
+    def __init__(self, canvas, height, top_n=12, text_color="#e5e7eb",
+                 sub_color="#9ca3af", axis_color="#1f2937"):
+        self.canvas = canvas
+        self.height = height
+        self.top_n = top_n
+        self.text_color, self.sub_color = text_color, sub_color
+        self.data = []       # [(label, paise, color)] in bar order
+        self.peak = 1
+        self.items = {}      # label -> (bar, value text, label text)
+        self.drawn = {}      # label -> state the items were last drawn with
+        self.axis = canvas.create_line(0, 0, 0, 0, fill=axis_color, width=2)
+        self.scrollbar = None
+        canvas.bind("<Configure>", lambda e: self.draw_visible())
+
+    def attach_scrollbar(self, scrollbar):
+        """Draw newly exposed bars on every scroll, whatever caused it."""
+        self.scrollbar = scrollbar
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            self.draw_visible()
+
+        self.canvas.configure(xscrollcommand=on_scroll)
+        scrollbar.configure(command=self.canvas.xview)
+
+    @staticmethod
+    def fold(values, top_n):
+        """[(label, paise)] largest first, the tail summed into "Other"."""
+        ranked = sorted(values.items(), key=lambda kv: (-kv[1], kv[0]))
+        if len(ranked) <= top_n:
+            return ranked
+        head, tail = ranked[:top_n - 1], ranked[top_n - 1:]
+        other = sum(v for _, v in tail)
+        merged = dict(head)
+        merged["Other"] = merged.get("Other", 0) + other
+        return sorted(merged.items(), key=lambda kv: (-kv[1], kv[0]))
+
+    def update(self, values, color_of):
+        """Show ``values`` ({label: paise}); ``color_of(label)`` -> color."""
+        folded = self.fold(values, self.top_n)
+        self.data = [(label, value, color_of(label)) for label, value in folded]
+        self.peak = max((v for _, v, _ in self.data), default=0) or 1
+
+        slots = {label: i for i, (label, _, _) in enumerate(self.data)}
+        for label in list(self.items):
+            if label not in slots:
+                for item in self.items.pop(label):
+                    self.canvas.delete(item)
+                self.drawn.pop(label, None)
+            elif self.drawn.get(label, (None,))[0] != slots[label]:
+                # re-ranked: hide until its new slot is drawn, or an
+                # off-screen bar would sit on top of the one drawn there
+                for item in self.items[label]:
+                    self.canvas.itemconfigure(item, state="hidden")
+                self.drawn.pop(label, None)
+
+        width = 2 * self.MARGIN + self.PITCH * len(self.data)
+        bottom = self.height - 40
+        self.canvas.coords(self.axis, self.MARGIN, bottom, width - self.MARGIN, bottom)
+        self.canvas.configure(scrollregion=(0, 0, width, self.height))
+        self.draw_visible()
+
+    def visible_range(self):
+        left = self.canvas.canvasx(0)
+        right = left + max(self.canvas.winfo_width(), self.PITCH)
+        lo = int((left - self.MARGIN) // self.PITCH) - 1
+        hi = int((right - self.MARGIN) // self.PITCH) + 2
+        return max(lo, 0), min(hi, len(self.data))
+
+    def draw_visible(self):
+        lo, hi = self.visible_range()
+        for i in range(lo, hi):
+            self._draw(i)
+
+    def _draw(self, i):
+        label, value, color = self.data[i]
+        state = (i, value, self.peak, color)
+        if self.drawn.get(label) == state:
+            return
+        bottom = self.height - 40
+        x = self.MARGIN + self.PITCH * (i + 0.5)
+        half = self.PITCH * 0.25
+        y0 = bottom - (bottom - self.TOP) * value / self.peak
+        name = label
+        if len(name) > self.LABEL_CHARS:
+            name = name[:self.LABEL_CHARS - 1] + "…"
+
+        items = self.items.get(label)
+        if items is None:
+            items = (
+                self.canvas.create_rectangle(0, 0, 0, 0),
+                self.canvas.create_text(0, 0, fill=self.text_color, font=("Inter", 10)),
+                self.canvas.create_text(
+                    0, 0, fill=self.sub_color, font=("Inter", 10), anchor="n"
+                ),
+            )
+            self.items[label] = items
+        bar, value_text, label_text = items
+        self.canvas.coords(bar, x - half, y0, x + half, bottom)
+        self.canvas.itemconfigure(bar, fill=color, outline=color)
+        self.canvas.coords(value_text, x, y0 - 10)
+        self.canvas.itemconfigure(value_text, text=format_money(value, 0))
+        self.canvas.coords(label_text, x, bottom + 14)
+        self.canvas.itemconfigure(label_text, text=name)
+        for item in items:
+            self.canvas.itemconfigure(item, state="normal")
+        self.drawn[label] = state
+
+
+class CalendarHeatmap:
+    """A year of daily spend as a GitHub-style grid on one Tk canvas.
+
+    Columns are weeks (Monday on top), colours are quartiles of the
+    year's non-zero days. ``draw`` lays out the whole year once;
+    ``set_day`` recolours a single cell in place.
+    """
+
+    CELL = 11
+    GAP = 2
+    LEFT = 26   # room for weekday labels
+    TOP = 16    # room for month labels
+    LEVELS = ("#111827", "#14532d", "#15803d", "#22c55e", "#86efac")
+
+    def __init__(self, canvas, year, text_color="#9ca3af", on_pick=None):
+        self.canvas = canvas
+        self.year = year
+        self.text_color = text_color
+        self.values = {}
+        self.thresholds = []
+        self.items = {}  # date -> rectangle
+        self.on_pick = on_pick  # called with (date, paise) on click
+        self.stamp = None  # caller's note of what the drawn values reflect
+        canvas.bind("<Button-1>", self._on_click)
+
+    @property
+    def first(self):
+        return date(self.year, 1, 1)
+
+    def _cell(self, day):
+        """(column, row) of ``day``: its week of the year and weekday."""
+        offset = day.toordinal() - self.first.toordinal() + self.first.weekday()
+        return offset // 7, day.weekday()
+
+    def size(self):
+        step = self.CELL + self.GAP
+        cols = self._cell(date(self.year, 12, 31))[0] + 1
+        return self.LEFT + cols * step, self.TOP + 7 * step
+
+    def level(self, paise):
+        if paise <= 0:
+            return 0
+        return min(1 + bisect.bisect_left(self.thresholds, paise), 4)
+
+    def draw(self, values):
+        """Lay out the year from ``values`` ({date: paise})."""
+        canvas, step = self.canvas, self.CELL + self.GAP
+        canvas.delete("all")
+        self.values = values
+        spent = sorted(v for d, v in values.items() if v > 0 and d.year == self.year)
+        self.thresholds = [_percentile(spent, q) for q in (25, 50, 75)] if spent else []
+
+        self.items = {}
+        first = self.first.toordinal()
+        for n in range(first, date(self.year, 12, 31).toordinal() + 1):
+            day = date.fromordinal(n)
+            col, row = self._cell(day)
+            x, y = self.LEFT + col * step, self.TOP + row * step
+            self.items[day] = canvas.create_rectangle(
+                x, y, x + self.CELL, y + self.CELL, width=0,
+                fill=self.LEVELS[self.level(values.get(day, 0))],
+            )
+            if day.day == 1:
+                canvas.create_text(
+                    x, 0, text=day.strftime("%b"), anchor="nw",
+                    fill=self.text_color, font=("Inter", 8),
+                )
+        for row, name in ((0, "Mon"), (2, "Wed"), (4, "Fri")):
+            canvas.create_text(
+                0, self.TOP + row * step, text=name, anchor="nw",
+                fill=self.text_color, font=("Inter", 8),
+            )
+        width, height = self.size()
+        canvas.configure(scrollregion=(0, 0, width, height))
+
+    def set_day(self, day, paise):
+        """Recolour one cell (on the scale of the last full draw)."""
+        item = self.items.get(day)
+        if item is None:
+            return
+        self.values[day] = paise
+        self.canvas.itemconfigure(item, fill=self.LEVELS[self.level(paise)])
+
+    def _on_click(self, event):
+        if self.on_pick is None:
+            return
+        step = self.CELL + self.GAP
+        col = int((self.canvas.canvasx(event.x) - self.LEFT) // step)
+        row = int((event.y - self.TOP) // step)
+        if col < 0 or not 0 <= row < 7:
+            return
+        n = self.first.toordinal() - self.first.weekday() + 7 * col + row
+        day = date.fromordinal(max(n, 1))
+        if day.year == self.year:
+            self.on_pick(day, self.values.get(day, 0))
+
+
 # ---------- Splash Screen ---------- #
 
 class SplashScreen(ctk.CTkToplevel):
@@ -124,7 +3398,28 @@ class ExpenseAppCTk:
     RED = "#ef4444"
     YELLOW = "#eab308"
 
-    def __init__(self, root: ctk.CTk):
+    BATCH_ROWS = 7  # blank rows the batch sheet opens with
+    NEW_LEDGER = "New ledger…"
+    CHART_TOP_N = 12  # stats chart bars before the tail folds into "Other"
+
+    # Repeat menu label -> recurring frequency (None = one-off expense)
+    REPEAT_CHOICES = {
+        "Once": None,
+        "Daily": "daily",
+        "Weekly": "weekly",
+        "Monthly": "monthly",
+        "Every N days": "custom",
+    }
+
+    # per-ledger state swapped out (not reloaded) when switching ledgers
+    LEDGER_ATTRS = (
+        "expenses", "budgets", "store", "watcher", "pager", "cube", "burn_rate",
+        "anomalies", "rules", "limits", "_analytics", "last_anomaly",
+        "history_anchor", "row_index", "queries", "day_totals", "receipts",
+    )
+
+    def __init__(self, root: ctk.CTk, low_memory=LOW_MEMORY, history_cap=HISTORY_CAP,
+                 ledgers=None):
         self.root = root
         self.root.title("Futuristic Expense Tracker")
         self.root.geometry("400x780")
@@ -134,7 +3429,20 @@ class ExpenseAppCTk:
         ctk.set_default_color_theme("dark-blue")
         self.root.configure(fg_color=self.BG)
 
-        self.expenses, self.budgets = load_data()
+        self.low_memory = low_memory
+        self.history_cap = history_cap if low_memory else None
+        self.ledgers = ledgers or LedgerSet()
+        self.ledgers.activate(self.ledgers.active)  # absolute paths from the start
+        self.query_text = ""  # history / stats filter, kept across ledgers
+        self._parked = {}  # ledger name -> its LEDGER_ATTRS while inactive
+        doc = self._open_ledger()
+        self._report_job = None  # Future while reports are being written
+        self._stats_view = None  # (window, chart, label, period, totals, heatmap)
+        self._thumb_slots = {}   # receipt label -> key, until first on screen
+        self._thumb_jobs = []    # (label, Future) while thumbnails are made
+        self._thumb_check = False
+        self._sections = {}  # month -> {"header", "body", "rows", "built"}
+        self._expanded_months = {current_month_key()}  # the rest start collapsed
 
         # Scrollable main area
         self.main = ctk.CTkScrollableFrame(
@@ -143,14 +3451,189 @@ class ExpenseAppCTk:
             border_width=0,
         )
         self.main.pack(fill="both", expand=True, padx=12, pady=12)
+        # scrolling moves the inner frame, which reports it as a Configure
+        self.main.bind("<Configure>", self._schedule_thumb_check, add="+")
 
         self.build_header(self.main)
         self.build_budget_card(self.main)
         self.build_add_expense_card(self.main)
         self.build_history_section(self.main)
 
-        self.refresh_history()
-        self.update_budget_status()
+        # every later redraw goes through the scheduler
+        self.render = RenderScheduler(self.root, self._render_frame)
+        self.render.register("history", lambda f: self.refresh_history(), ("total",))
+        self.render.register("total", lambda f: self._update_history_total())
+        self.render.register("budget", self.update_budget_status)
+        self.render.register("stats", self._update_stats_view)
+        self.render.mark("history", "budget")
+        self.render.flush()
+
+        if doc.get("damaged"):
+            messagebox.showwarning(
+                "Damaged data",
+                f"{doc['damaged']} damaged part(s) of {DATA_FILE} could not be "
+                f"read and were skipped. A copy was kept as {DATA_FILE}.damaged.",
+            )
+
+        self.root.after(WATCH_INTERVAL_MS, self._poll_data_file)
+
+    def _open_ledger(self):
+        """Load the active ledger's files into fresh per-ledger state."""
+        # low-memory mode pages month shards in and out, so it needs them
+        self.pager = None
+        self.history_anchor = None  # key of the newest card on the page
+        if self.low_memory:
+            migrate_to_shards()
+            doc = load_ledger(months=[current_month_key()])
+        else:
+            doc = load_ledger()
+
+        self.expenses, self.budgets = doc["expenses"], doc["budgets"]
+        CATEGORIES.intern_expenses(self.expenses)
+        self.store = ExpenseStore(self.expenses, self.budgets, doc["generation"])
+        self.watcher = LedgerWatcher()
+        if self.low_memory:
+            self.pager = MonthPager(self.store, [current_month_key()])
+            cube = MonthCube.load(doc["generation"])
+            self.cube = self.store.attach(cube, replay=False)
+        else:
+            self.cube = self.store.attach(MonthCube())
+        self.burn_rate = self.store.attach(BurnRateForecast())
+        self.anomalies = self.store.attach(AnomalyDetector())
+        self.row_index = self.store.attach(RowIndex())
+        self.day_totals = self.store.attach(DayTotals(complete=not self.low_memory))
+        self.queries = QueryCache()
+        self.last_anomaly = None  # (record key, message) of the latest flag
+        self.rules = RecurringRules.load()
+        self.limits = CategoryBudgets.load()
+        self.receipts = ReceiptStore()
+        self._analytics = None  # (versions, engine), rebuilt lazily
+        return doc
+
+    def switch_ledger(self, name):
+        """Make ``name`` active; a ledger opened before is swapped back in."""
+        if name == self.ledgers.active:
+            return
+        if self._report_job is not None:
+            messagebox.showinfo("Ledgers", "Wait for the reports to finish first.")
+            return
+        current = self.ledgers.active
+        parked = {attr: getattr(self, attr) for attr in self.LEDGER_ATTRS}
+        try:
+            name = self.ledgers.activate(name)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Ledgers", f"Cannot open ledger: {e}")
+            return
+        self._parked[current] = parked
+
+        state = self._parked.pop(name, None)
+        if state is None:
+            self._open_ledger()
+        else:
+            for attr, value in state.items():
+                setattr(self, attr, value)
+            self.check_external_changes()  # writes made while it was parked
+
+        budget = self.budgets.get(current_month_key())
+        self.budget_var.set(paise_text(budget) if budget is not None else "")
+        self.ledger_var.set(name)
+        self.ledger_menu.configure(values=self.ledgers.names() + [self.NEW_LEDGER])
+        self.render.mark("history", "budget", "stats")
+
+    def on_ledger_selected(self, choice):
+        if choice == self.NEW_LEDGER:
+            dialog = ctk.CTkInputDialog(
+                text="Name for the new ledger:", title="New ledger"
+            )
+            choice = (dialog.get_input() or "").strip()
+            if not choice:
+                self.ledger_var.set(self.ledgers.active)
+                return
+        self.switch_ledger(choice)
+        self.ledger_var.set(self.ledgers.active)
+
+    def ledger_cubes(self):
+        """{ledger: MonthCube} for every ledger; unopened ones in a thread pool."""
+        cubes = {name: state["cube"] for name, state in self._parked.items()}
+        cubes[self.ledgers.active] = self.cube
+        others = [n for n in self.ledgers.names() if n not in cubes]
+        if others:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(8, len(others))) as pool:
+                paths = [self.ledgers.path(n) for n in others]
+                cubes.update(zip(others, pool.map(ledger_cube, paths)))
+        return cubes
+
+    def combined_totals(self, period):
+        """(spent, {category: paise}) for a Period across all ledgers."""
+        per_cat = MonthCube.merged(self.ledger_cubes().values()).period_totals(
+            period.months()
+        )
+        start, end = period.bounds()
+        end = min(end, date.today())
+        if start <= end:
+            for rules in self.ledger_rules():
+                for cat, paise in rules.totals(start, end).items():
+                    per_cat[cat] = per_cat.get(cat, 0) + paise
+        return sum(per_cat.values()), per_cat
+
+    def ledger_rules(self):
+        """RecurringRules of every ledger, the active one last."""
+        rule_sets = [state["rules"] for state in self._parked.values()]
+        for name in self.ledgers.names():
+            if name != self.ledgers.active and name not in self._parked:
+                path = ledger_file(self.ledgers.path(name), "RECURRING_FILE")
+                rule_sets.append(RecurringRules.load(path))
+        rule_sets.append(self.rules)
+        return rule_sets
+
+    def query_rows(self):
+        """Rows matching the filter, oldest first, cached per data version."""
+        def run(query):
+            first = self.rules.first_start()
+            extra = self.rules.rows(first, date.today()) if first else ()
+            return query.run(self.expenses, self.row_index, extra)
+
+        version = (self.store.version, self.rules.version)
+        return self.queries.get(self.query_text, version, run)
+
+    def query_totals(self, period):
+        """(spent, {category: paise}) of the filtered rows in a Period."""
+        months = set(period.months())
+        per_cat = {}
+        for exp in self.query_rows():
+            if shard_month(exp) in months:
+                cat = CATEGORIES.canonical(exp.get("category", "Other"))
+                per_cat[cat] = per_cat.get(cat, 0) + base_paise(exp)
+        return sum(per_cat.values()), per_cat
+
+    def period_rollups(self, period, combined=False):
+        """({category or ancestor: paise}, {tag: paise}) for a Period."""
+        if self.query_text and not combined:
+            months = set(period.months())
+            tags = {}
+            for exp in self.query_rows():
+                if shard_month(exp) in months:
+                    for tag in exp.get("tags", ()):
+                        tags[tag] = tags.get(tag, 0) + base_paise(exp)
+            return category_rollup(self.query_totals(period)[1]), tags
+        if combined:
+            cube = MonthCube.merged(self.ledger_cubes().values())
+            rule_sets = self.ledger_rules()
+        else:
+            cube, rule_sets = self.cube, [self.rules]
+        tree = cube.period_tree(period.months())
+        tags = cube.period_tags(period.months())
+        start, end = period.bounds()
+        end = min(end, date.today())
+        if start <= end:
+            for rules in rule_sets:
+                for node, paise in category_rollup(rules.totals(start, end)).items():
+                    tree[node] = tree.get(node, 0) + paise
+                for tag, paise in rules.tag_totals(start, end).items():
+                    tags[tag] = tags.get(tag, 0) + paise
+        return tree, tags
 
     # ---------- UI sections ---------- #
 
@@ -182,6 +3665,21 @@ class ExpenseAppCTk:
         )
         today.pack(anchor="w", pady=(4, 0))
 
+        self.ledger_var = ctk.StringVar(value=self.ledgers.active)
+        self.ledger_menu = ctk.CTkOptionMenu(
+            container,
+            values=self.ledgers.names() + [self.NEW_LEDGER],
+            variable=self.ledger_var,
+            command=self.on_ledger_selected,
+            fg_color="#020617",
+            button_color=self.CARD_BORDER,
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 11),
+            corner_radius=10,
+            width=160,
+        )
+        self.ledger_menu.pack(anchor="w", pady=(6, 0))
+
     def build_budget_card(self, parent):
         month_text = date.today().strftime("%B %Y")
 
@@ -231,7 +3729,7 @@ class ExpenseAppCTk:
         self.budget_var = ctk.StringVar()
         mkey = current_month_key()
         if mkey in self.budgets:
-            self.budget_var.set(str(self.budgets[mkey]))
+            self.budget_var.set(paise_text(self.budgets[mkey]))
 
         entry = ctk.CTkEntry(
             col_left,
@@ -269,6 +3767,16 @@ class ExpenseAppCTk:
         )
         self.budget_status_label.pack(anchor="w", padx=12, pady=(4, 2))
 
+        self.forecast_label = ctk.CTkLabel(
+            self.budget_card,
+            text="",
+            text_color=self.TEXT_SUB,
+            font=("Inter", 10),
+            wraplength=340,
+            justify="left",
+        )
+        self.forecast_label.pack(anchor="w", padx=12, pady=(0, 2))
+
         self.advice_label = ctk.CTkLabel(
             self.budget_card,
             text="Set a monthly budget to get smart advice on controlling expenses.",
@@ -279,6 +3787,55 @@ class ExpenseAppCTk:
         )
         self.advice_label.pack(anchor="w", padx=12, pady=(0, 10))
 
+        # per-category limits: "Food: ₹2300 / ₹3000" lines + a set row
+        self.limits_label = ctk.CTkLabel(
+            self.budget_card,
+            text="",
+            text_color=self.TEXT_SUB,
+            font=("Inter", 10),
+            wraplength=340,
+            justify="left",
+        )
+        self.limits_label.pack(anchor="w", padx=12, pady=(0, 4))
+
+        self.limit_cat_var = ctk.StringVar()
+        self.limit_amount_var = ctk.StringVar()
+        self.limit_warn_var = ctk.StringVar(value=str(CategoryBudgets.WARN_PCT))
+        limit_row = ctk.CTkFrame(self.budget_card, fg_color="transparent")
+        limit_row.pack(fill="x", padx=12, pady=(0, 8))
+        for var, hint, width in (
+            (self.limit_cat_var, "Category", 120),
+            (self.limit_amount_var, "Limit", 90),
+            (self.limit_warn_var, "Warn %", 60),
+        ):
+            entry = ctk.CTkEntry(
+                limit_row,
+                textvariable=var,
+                placeholder_text=hint,
+                fg_color="#020617",
+                text_color=self.TEXT_MAIN,
+                border_color=self.CARD_BORDER,
+                border_width=1,
+                corner_radius=10,
+                font=("Inter", 11),
+                width=width,
+            )
+            entry.pack(side="left", padx=(0, 4))
+
+        btn_limit = ctk.CTkButton(
+            limit_row,
+            text="Set",
+            command=self.on_set_category_budget,
+            fg_color=self.ORANGE,
+            hover_color=self.ORANGE_HOVER,
+            text_color="white",
+            font=("Inter", 11, "bold"),
+            corner_radius=40,
+            height=30,
+            width=50,
+        )
+        btn_limit.pack(side="right")
+
         btn_summary = ctk.CTkButton(
             self.budget_card,
             text="This Month Summary",
@@ -290,7 +3847,22 @@ class ExpenseAppCTk:
             corner_radius=40,
             height=38,
         )
-        btn_summary.pack(fill="x", padx=12, pady=(0, 10))
+        btn_summary.pack(fill="x", padx=12, pady=(0, 6))
+
+        self.btn_reports = ctk.CTkButton(
+            self.budget_card,
+            text="Save Reports (last 12 months)",
+            command=self.on_export_reports,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            text_color=self.BLUE,
+            font=("Inter", 11, "bold"),
+            corner_radius=40,
+            height=34,
+        )
+        self.btn_reports.pack(fill="x", padx=12, pady=(0, 10))
 
     def build_add_expense_card(self, parent):
         self.add_card = ctk.CTkFrame(
@@ -331,13 +3903,91 @@ class ExpenseAppCTk:
         self.amount_var = ctk.StringVar()
         self.category_var = ctk.StringVar(value="Food")
         self.note_var = ctk.StringVar()
+        self.tags_var = ctk.StringVar()
         self.date_var = ctk.StringVar(value=get_today_str())
 
-        self._build_labeled_entry(self.add_card, "Amount (₹)", self.amount_var)
+        self._build_labeled_entry(self.add_card, "Amount", self.amount_var)
+
+        # only currencies with imported rates can be picked
+        self.currency_var = ctk.StringVar(value=BASE_CURRENCY)
+        if len(RATES.currencies()) > 1:
+            currency_row = ctk.CTkFrame(self.add_card, fg_color="transparent")
+            currency_row.pack(fill="x", padx=12, pady=(4, 2))
+
+            currency_label = ctk.CTkLabel(
+                currency_row,
+                text="Currency",
+                text_color=self.TEXT_SUB,
+                font=("Inter", 10),
+            )
+            currency_label.pack(anchor="w")
+
+            currency_menu = ctk.CTkOptionMenu(
+                currency_row,
+                values=RATES.currencies(),
+                variable=self.currency_var,
+                fg_color="#020617",
+                button_color=self.CARD_BORDER,
+                text_color=self.TEXT_MAIN,
+                font=("Inter", 12),
+                corner_radius=10,
+            )
+            currency_menu.pack(fill="x", pady=(2, 0))
+
         self._build_labeled_entry(self.add_card, "Category", self.category_var)
         self._build_labeled_entry(self.add_card, "Note (optional)", self.note_var)
+        self._build_labeled_entry(
+            self.add_card, "Tags (comma separated)", self.tags_var
+        )
+
+        self.receipt_src = None
+        self.btn_receipt = ctk.CTkButton(
+            self.add_card,
+            text="Attach Receipt…",
+            command=self.on_attach_receipt,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            text_color=self.TEXT_SUB,
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            font=("Inter", 11),
+            corner_radius=10,
+            height=32,
+        )
+        self.btn_receipt.pack(fill="x", padx=12, pady=(6, 2))
         self._build_labeled_entry(self.add_card, "Date (DD-MM-YYYY)", self.date_var)
 
+        self.repeat_var = ctk.StringVar(value="Once")
+        self.interval_var = ctk.StringVar(value="14")
+        repeat_row = ctk.CTkFrame(self.add_card, fg_color="transparent")
+        repeat_row.pack(fill="x", padx=12, pady=(4, 2))
+        self.repeat_row = repeat_row
+
+        repeat_label = ctk.CTkLabel(
+            repeat_row,
+            text="Repeat",
+            text_color=self.TEXT_SUB,
+            font=("Inter", 10),
+        )
+        repeat_label.pack(anchor="w")
+
+        repeat_menu = ctk.CTkOptionMenu(
+            repeat_row,
+            values=list(self.REPEAT_CHOICES),
+            variable=self.repeat_var,
+            command=self._on_repeat_changed,
+            fg_color="#020617",
+            button_color=self.CARD_BORDER,
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 12),
+            corner_radius=10,
+        )
+        repeat_menu.pack(fill="x", pady=(2, 0))
+
+        # only shown for "Every N days"
+        self.interval_row = ctk.CTkFrame(self.add_card, fg_color="transparent")
+        self._build_labeled_entry(self.interval_row, "Every N days", self.interval_var)
+
         btn_add = ctk.CTkButton(
             self.add_card,
             text="Add Expense",
@@ -351,6 +4001,21 @@ class ExpenseAppCTk:
         )
         btn_add.pack(fill="x", padx=12, pady=(8, 6))
 
+        btn_batch = ctk.CTkButton(
+            self.add_card,
+            text="Batch Entry…",
+            command=self.open_batch_entry,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            text_color=self.BLUE,
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            font=("Inter", 11, "bold"),
+            corner_radius=40,
+            height=36,
+        )
+        btn_batch.pack(fill="x", padx=12, pady=(0, 6))
+
         btn_delete = ctk.CTkButton(
             self.add_card,
             text="Delete Last Expense",
@@ -366,6 +4031,12 @@ class ExpenseAppCTk:
         )
         btn_delete.pack(fill="x", padx=12, pady=(0, 12))
 
+    def _on_repeat_changed(self, choice):
+        if self.REPEAT_CHOICES.get(choice) == "custom":
+            self.interval_row.pack(fill="x", after=self.repeat_row)
+        else:
+            self.interval_row.pack_forget()
+
     def _build_labeled_entry(self, parent, label_text, var):
         wrapper = ctk.CTkFrame(parent, fg_color="transparent")
         wrapper.pack(fill="x", padx=12, pady=(4, 2))
@@ -427,20 +4098,76 @@ class ExpenseAppCTk:
         )
         self.total_label.pack(side="right")
 
+        filter_row = ctk.CTkFrame(self.history_card, fg_color="transparent")
+        filter_row.pack(fill="x", padx=12, pady=(0, 6))
+
+        self.query_var = ctk.StringVar()
+        query_entry = ctk.CTkEntry(
+            filter_row,
+            textvariable=self.query_var,
+            placeholder_text='category:food amount>500 note~"uber"',
+            fg_color="#020617",
+            text_color=self.TEXT_MAIN,
+            border_color=self.CARD_BORDER,
+            border_width=1,
+            corner_radius=10,
+            font=("Inter", 11),
+        )
+        query_entry.pack(side="left", fill="x", expand=True)
+        query_entry.bind("<Return>", lambda e: self.on_apply_filter())
+
+        btn_clear = ctk.CTkButton(
+            filter_row,
+            text="Clear",
+            command=self.on_clear_filter,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            text_color=self.TEXT_SUB,
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            font=("Inter", 10, "bold"),
+            corner_radius=10,
+            height=28,
+            width=56,
+        )
+        btn_clear.pack(side="right", padx=(4, 0))
+
+        btn_filter = ctk.CTkButton(
+            filter_row,
+            text="Filter",
+            command=self.on_apply_filter,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            text_color=self.BLUE,
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            font=("Inter", 10, "bold"),
+            corner_radius=10,
+            height=28,
+            width=56,
+        )
+        btn_filter.pack(side="right", padx=(4, 0))
+
         # list container
         self.history_list = ctk.CTkFrame(self.history_card, fg_color="transparent")
         self.history_list.pack(fill="both", expand=True, padx=8, pady=(0, 10))
 
+        # paging controls, only used when the history is capped
+        self.history_nav = ctk.CTkFrame(self.history_card, fg_color="transparent")
+        self.history_nav.pack(fill="x", padx=12, pady=(0, 6))
+        self.btn_newer = self._build_nav_button("‹ Newer", self.on_history_newer)
+        self.btn_older = self._build_nav_button("Older ›", self.on_history_older)
+
         hint_row = ctk.CTkFrame(self.history_card, fg_color="transparent")
         hint_row.pack(fill="x", padx=12, pady=(0, 10))
 
-        hint = ctk.CTkLabel(
+        self.history_hint = ctk.CTkLabel(
             hint_row,
             text="Newest expenses appear at the top.",
             text_color=self.TEXT_SUB,
             font=("Inter", 9),
         )
-        hint.pack(side="left", anchor="w")
+        self.history_hint.pack(side="left", anchor="w")
 
         stats_btn = ctk.CTkButton(
             hint_row,
@@ -458,6 +4185,38 @@ class ExpenseAppCTk:
         )
         stats_btn.pack(side="right")
 
+    def on_apply_filter(self):
+        text = self.query_var.get().strip()
+        if text:
+            try:
+                self.queries.compile(text)
+            except ValueError as e:
+                messagebox.showerror("Filter", str(e))
+                return
+        self.query_text = text
+        self.history_anchor = None
+        self.render.mark("history", "stats")
+
+    def on_clear_filter(self):
+        self.query_var.set("")
+        self.on_apply_filter()
+
+    def _build_nav_button(self, text, command):
+        return ctk.CTkButton(
+            self.history_nav,
+            text=text,
+            command=command,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            text_color=self.TEXT_SUB,
+            font=("Inter", 10, "bold"),
+            corner_radius=40,
+            height=28,
+            width=90,
+        )
+
     # ---------- Actions ---------- #
 
     def on_set_budget(self):
@@ -466,7 +4225,7 @@ class ExpenseAppCTk:
             messagebox.showwarning("Budget", "Please enter an amount for budget.")
             return
         try:
-            value = float(text)
+            value = to_paise(text)
             if value <= 0:
                 raise ValueError
         except ValueError:
@@ -475,14 +4234,104 @@ class ExpenseAppCTk:
 
         mkey = current_month_key()
         self.budgets[mkey] = value
-        save_data(self.expenses, self.budgets)
-        self.update_budget_status()
+        self.save(months=())
+        self.render.mark("budget")
         messagebox.showinfo("Budget", "Monthly budget saved.")
 
+    def on_set_category_budget(self):
+        category = self.limit_cat_var.get().strip()
+        if not category:
+            messagebox.showwarning("Category budget", "Enter a category.")
+            return
+        text = self.limit_amount_var.get().strip()
+        try:
+            value = to_paise(text) if text else 0
+            warn = int(self.limit_warn_var.get().strip() or CategoryBudgets.WARN_PCT)
+            if value < 0 or not 0 < warn <= CategoryBudgets.ALERT_PCT:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror(
+                "Category budget",
+                "Enter a positive limit and a warn % between 1 and 100.",
+            )
+            return
+
+        # an empty or zero limit clears the category's budget
+        if value:
+            self.limits.set(category, value, warn)
+        else:
+            self.limits.remove(category)
+        self.limits.save()
+        self.watcher.mark_synced()
+        self.limit_cat_var.set("")
+        self.limit_amount_var.set("")
+        self.render.mark("budget")
+
+    @staticmethod
+    def parse_entry(amount_str, date_str):
+        """(paise, date string) for form input; ValueError(title, message)."""
+        try:
+            paise = to_paise(amount_str)
+            if paise <= 0:
+                raise ValueError
+        except ValueError:
+            raise ValueError("Invalid", "Please enter a valid amount.")
+
+        if not date_str:
+            date_str = get_today_str()
+
+        try:
+            datetime.strptime(date_str, "%d-%m-%Y")
+        except ValueError:
+            raise ValueError(
+                "Invalid date",
+                "Use DD-MM-YYYY format (e.g. 28-11-2025).",
+            )
+        return paise, date_str
+
+    @staticmethod
+    def new_expense(paise, category, note, date_str, currency=BASE_CURRENCY,
+                    tags=(), receipt=None):
+        expense = {
+            "id": uuid.uuid4().hex,
+            "paise": paise,
+            "category": CATEGORIES.canonical(category),
+            "note": note,
+            "date": date_str,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if currency != BASE_CURRENCY:
+            expense["currency"] = currency
+        tags = normalize_tags(tags)
+        if tags:
+            expense["tags"] = tags
+        if receipt:
+            expense["receipt"] = receipt
+        return expense
+
+    def add_expenses(self, expenses):
+        """Add rows and commit them in one save; returns any warnings."""
+        months = {shard_month(e) for e in expenses}
+        # the months' shards are rewritten, so all their rows must be loaded
+        held = self.pager.hold(months) if self.pager is not None else nullcontext()
+        warnings = []
+        with held:
+            for expense in expenses:
+                anomaly = self.anomalies.check(expense)
+                self.store.add(expense)
+                if anomaly is not None:
+                    text = self.anomaly_text(anomaly)
+                    self.last_anomaly = (record_key(expense), text)
+                    warnings.append(text)
+                warnings.extend(self.check_category_limit(expense))
+            self.save(months=months)
+        return warnings
+
     def on_add_expense(self):
         amount_str = self.amount_var.get().strip()
         category = self.category_var.get().strip() or "Other"
         note = self.note_var.get().strip()
+        tags = normalize_tags(self.tags_var.get())
         date_str = self.date_var.get().strip()
 
         if not amount_str:
@@ -490,42 +4339,247 @@ class ExpenseAppCTk:
             return
 
         try:
-            amount = float(amount_str)
-            if amount <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Invalid", "Please enter a valid amount.")
+            paise, date_str = self.parse_entry(amount_str, date_str)
+        except ValueError as e:
+            messagebox.showerror(*e.args)
+            return
+
+        currency = self.currency_var.get() or BASE_CURRENCY
+
+        freq = self.REPEAT_CHOICES.get(self.repeat_var.get())
+        if freq is not None:
+            category = CATEGORIES.canonical(category)
+            self._add_recurring(paise, category, note, date_str, freq, currency, tags)
             return
 
-        if not date_str:
-            date_str = get_today_str()
+        receipt = None
+        if self.receipt_src:
+            try:
+                receipt = self.receipts.add(self.receipt_src)
+            except OSError as e:
+                messagebox.showerror("Receipt", f"Could not store the receipt: {e}")
+                return
+
+        expense = self.new_expense(
+            paise, category, note, date_str, currency, tags, receipt
+        )
+        warnings = self.add_expenses([expense])
+
+        self.amount_var.set("")
+        self.note_var.set("")
+        self.tags_var.set("")
+        self._set_receipt(None)
+        self.date_var.set(get_today_str())
+
+        self.render.mark("history", "budget", "stats")
+        if warnings:
+            messagebox.showwarning(
+                "Heads up",
+                "Expense added.\n\n" + "\n".join(warnings),
+            )
+        else:
+            messagebox.showinfo("Added", "Expense added successfully.")
+
+    def on_attach_receipt(self):
+        path = filedialog.askopenfilename(
+            title="Receipt image",
+            filetypes=[
+                ("Images", "*.jpg *.jpeg *.png *.gif *.webp *.heic"),
+                ("All files", "*.*"),
+            ],
+        )
+        if path:
+            self._set_receipt(path)
+
+    def _set_receipt(self, path):
+        self.receipt_src = path
+        text = f"📎 {os.path.basename(path)}" if path else "Attach Receipt…"
+        self.btn_receipt.configure(text=text)
+
+    def open_batch_entry(self):
+        """Sheet for entering many expenses, committed together."""
+        win = ctk.CTkToplevel(self.root)
+        win.title("Batch Entry")
+        win.geometry("400x640")
+        win.configure(fg_color=self.BG)
+        win.grab_set()
+
+        title = ctk.CTkLabel(
+            win,
+            text="Batch Entry",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 16, "bold"),
+        )
+        title.pack(anchor="w", padx=16, pady=(16, 0))
+
+        hint = ctk.CTkLabel(
+            win,
+            text="Amount · Category · Note · Tags · Date (blank = today). "
+            f"Every row is in one currency ({BASE_CURRENCY} unless picked below). "
+            "Empty rows are skipped; nothing is saved unless every row is valid.",
+            text_color=self.TEXT_SUB,
+            font=("Inter", 10),
+            wraplength=360,
+            justify="left",
+        )
+        hint.pack(anchor="w", padx=16, pady=(0, 8))
+
+        # the sheet has its own currency, independent of the main card
+        currency_var = ctk.StringVar(value=BASE_CURRENCY)
+        if len(RATES.currencies()) > 1:
+            currency_menu = ctk.CTkOptionMenu(
+                win,
+                values=RATES.currencies(),
+                variable=currency_var,
+                fg_color="#020617",
+                button_color=self.CARD_BORDER,
+                text_color=self.TEXT_MAIN,
+                font=("Inter", 12),
+                corner_radius=10,
+                width=120,
+            )
+            currency_menu.pack(anchor="w", padx=16, pady=(0, 8))
+
+        sheet = ctk.CTkScrollableFrame(win, fg_color=self.BG, height=420)
+        sheet.pack(fill="both", expand=True, padx=10)
+        rows = []
+
+        def add_row():
+            line = ctk.CTkFrame(sheet, fg_color="transparent")
+            line.pack(fill="x", pady=2)
+            cells = []
+            for width in (60, 80, 80, 60, 76):
+                var = ctk.StringVar()
+                entry = ctk.CTkEntry(
+                    line,
+                    textvariable=var,
+                    fg_color="#020617",
+                    text_color=self.TEXT_MAIN,
+                    border_color=self.CARD_BORDER,
+                    border_width=1,
+                    corner_radius=8,
+                    font=("Inter", 11),
+                    width=width,
+                )
+                entry.pack(side="left", padx=(0, 3))
+                cells.append(var)
+            rows.append(cells)
+
+        for _ in range(self.BATCH_ROWS):
+            add_row()
+
+        buttons = ctk.CTkFrame(win, fg_color="transparent")
+        buttons.pack(fill="x", padx=12, pady=10)
+
+        more_btn = ctk.CTkButton(
+            buttons,
+            text="+ Row",
+            command=add_row,
+            fg_color="#020617",
+            hover_color="#0f172a",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            text_color=self.TEXT_SUB,
+            font=("Inter", 11, "bold"),
+            corner_radius=40,
+            height=36,
+            width=80,
+        )
+        more_btn.pack(side="left")
+
+        def save_all():
+            values = [[var.get().strip() for var in cells] for cells in rows]
+            if self.on_save_batch(values, currency_var.get() or BASE_CURRENCY):
+                win.destroy()
 
-        try:
-            datetime.strptime(date_str, "%d-%m-%Y")
-        except ValueError:
-            messagebox.showerror(
-                "Invalid date",
-                "Use DD-MM-YYYY format (e.g. 28-11-2025).",
-            )
-            return
+        save_btn = ctk.CTkButton(
+            buttons,
+            text="Save All",
+            command=save_all,
+            fg_color=self.ORANGE,
+            hover_color=self.ORANGE_HOVER,
+            text_color="white",
+            font=("Inter", 12, "bold"),
+            corner_radius=40,
+            height=36,
+        )
+        save_btn.pack(side="right")
+
+    def on_save_batch(self, values, currency=BASE_CURRENCY):
+        """Validate [amount, category, note, tags, date] rows, then add them all.
+
+        Every amount is in ``currency``, the sheet's own pick.
+        One save, one history refresh and one dialog for the whole batch.
+        Returns True when the rows were committed.
+        """
+        expenses, errors = [], []
+        for n, (amount_str, category, note, tags, date_str) in enumerate(values, 1):
+            if not (amount_str or category or note or tags or date_str):
+                continue
+            if not amount_str:
+                errors.append(f"Row {n}: Please enter an amount.")
+                continue
+            try:
+                paise, date_str = self.parse_entry(amount_str, date_str)
+            except ValueError as e:
+                errors.append(f"Row {n}: {e.args[1]}")
+                continue
+            expenses.append(self.new_expense(
+                paise, category or "Other", note, date_str, currency, tags
+            ))
+
+        if errors:
+            messagebox.showerror("Batch Entry", "\n".join(errors))
+            return False
+        if not expenses:
+            messagebox.showwarning("Batch Entry", "No rows to add.")
+            return False
+
+        warnings = self.add_expenses(expenses)
+        self.render.mark("history", "budget", "stats")
+        text = f"Added {len(expenses)} expenses."
+        if warnings:
+            messagebox.showwarning("Heads up", text + "\n\n" + "\n".join(warnings))
+        else:
+            messagebox.showinfo("Batch Entry", text)
+        return True
 
-        expense = {
-            "amount": amount,
-            "category": category,
-            "note": note,
-            "date": date_str,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        self.expenses.append(expense)
-        save_data(self.expenses, self.budgets)
+    def _add_recurring(self, paise, category, note, date_str, freq, currency,
+                       tags=()):
+        interval = 1
+        if freq == "custom":
+            try:
+                interval = int(self.interval_var.get().strip())
+                if interval <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror(
+                    "Invalid",
+                    "Repeat interval must be a whole number of days.",
+                )
+                return
+
+        self.rules.add(
+            paise, category, note, date_str, freq, interval, currency, tags
+        )
+        self.rules.save()
+        self.watcher.mark_synced()
 
         self.amount_var.set("")
         self.note_var.set("")
+        self.tags_var.set("")
         self.date_var.set(get_today_str())
+        self.repeat_var.set("Once")
+        self.interval_row.pack_forget()
 
-        self.refresh_history()
-        self.update_budget_status()
-        messagebox.showinfo("Added", "Expense added successfully.")
+        self.render.mark("history", "budget", "stats")
+        messagebox.showinfo("Added", "Recurring expense saved.")
+
+    def on_stop_recurring(self, rule_id):
+        self.rules.stop(rule_id)
+        self.rules.save()
+        self.watcher.mark_synced()
+        self.render.mark("history", "budget", "stats")
 
     def on_delete_last(self):
         if not self.expenses:
@@ -536,17 +4590,100 @@ class ExpenseAppCTk:
         text = (
             "Delete last expense?\n\n"
             f"Date: {last.get('date')}\n"
-            f"Amount: ₹{last.get('amount'):.2f}\n"
+            f"Amount: {row_money(last)}\n"
             f"Category: {last.get('category')}\n"
             f"Note: {last.get('note') or '-'}"
         )
         if messagebox.askyesno("Confirm", text):
-            self.expenses.pop()
-            save_data(self.expenses, self.budgets)
-            self.refresh_history()
-            self.update_budget_status()
+            self.store.pop()
+            self.save(months={shard_month(last)})
+            self.render.mark("history", "budget", "stats")
             messagebox.showinfo("Deleted", "Last expense deleted.")
 
+    # ---------- Persistence ---------- #
+
+    def save(self, months=None):
+        """Commit the ledger, first folding in anything written elsewhere.
+
+        The writer lock is held from the re-read to the commit, so two
+        processes can no longer both save on top of the same snapshot.
+        """
+        if self.pager is not None:
+            # only resident months may be rewritten
+            if months is None:
+                months = self.pager.pinned | set(self.pager.lru)
+            for month in months:
+                self.pager.ensure(month)
+
+        with WRITE_LOCK.hold():
+            self.check_external_changes()
+            self.store.generation += 1
+            save_data(
+                self.expenses,
+                self.budgets,
+                months=months,
+                generation=self.store.generation,
+            )
+            self.store.mark_synced()
+            self.watcher.mark_synced()
+        self.cube.save(self.store.generation)
+
+    def _poll_data_file(self):
+        self.check_external_changes()
+        self.root.after(WATCH_INTERVAL_MS, self._poll_data_file)
+
+    def check_external_changes(self):
+        """Merge records another process wrote and patch the UI in place."""
+        changed = self.watcher.poll()
+        if not changed:
+            return False
+
+        rules_changed = RECURRING_FILE in changed
+        limits_changed = LIMITS_FILE in changed
+        changed -= {RECURRING_FILE, LIMITS_FILE}
+        if limits_changed:
+            self.limits.reload()
+        if rules_changed:
+            self.rules.reload()
+        if rules_changed or limits_changed:
+            if not changed:
+                self.watcher.mark_synced()
+                self.render.mark("history", "budget", "stats")
+                return True
+
+        rows, months, budgets, generation = read_changes(changed)
+        self.watcher.mark_synced()
+        CATEGORIES.intern_expenses(rows)
+        added, removed = self.store.merge(rows, months)
+        self.store.generation = max(self.store.generation, generation)
+        if self.pager is not None:
+            for month in months or ():
+                if not self.pager.is_resident(month):
+                    in_month = [e for e in rows if shard_month(e) == month]
+                    self.cube.rebuild_month(month, in_month)
+                    self.day_totals.rebuild_month(month, in_month)
+
+        budgets_changed = self.store.merge_budgets(budgets)
+        if not (added or removed or budgets_changed or rules_changed or limits_changed):
+            return False
+
+        if budgets_changed:
+            budget = self.budgets.get(current_month_key())
+            self.budget_var.set(paise_text(budget) if budget is not None else "")
+        if rules_changed or self.query_text:
+            # a full redraw covers the cards below (and re-runs the filter)
+            self.render.mark("history", "budget", "stats")
+            return True
+
+        for exp in removed:
+            self._remove_history_card(exp)
+        for exp in added:
+            if not self._insert_history_row(exp):
+                self.render.mark("history", "budget", "stats")  # needs a new section
+                return True
+        self.render.mark("total", "budget", "stats")
+        return True
+
     def on_show_month_summary(self):
         month_name = date.today().strftime("%B %Y")
         spent, cat_totals = self.current_month_totals()
@@ -554,62 +4691,206 @@ class ExpenseAppCTk:
 
         if budget is None:
             msg = (
-                f"Total spent in {month_name}: ₹{spent:.2f}\n\n"
+                f"Total spent in {month_name}: {format_money(spent)}\n\n"
                 f"No budget set for this month yet."
             )
             messagebox.showinfo("Summary", msg)
             return
 
         diff = budget - spent
-        if abs(diff) < 0.01:
+        if diff == 0:
             status = "You are exactly on your budget this month."
         elif diff > 0:
-            status = f"Good job! You are under budget by ₹{diff:.2f}."
+            status = f"Good job! You are under budget by {format_money(diff)}."
         else:
-            status = f"You overspent this month by ₹{abs(diff):.2f}."
+            status = f"You overspent this month by {format_money(-diff)}."
 
-        advice = self.build_advice(diff, cat_totals)
+        forecast = self.month_forecast(budget)
+        advice = self.build_advice(diff, cat_totals, forecast, budget)
 
         msg = (
-            f"Budget for {month_name}: ₹{budget:.2f}\n"
-            f"Spent: ₹{spent:.2f}\n\n"
+            f"Budget for {month_name}: {format_money(budget)}\n"
+            f"Spent: {format_money(spent)}\n"
+            f"Projected by month end: {format_money(forecast.projected)}\n\n"
             f"{status}\n\n"
             f"Advice: {advice}"
         )
         messagebox.showinfo("Month Summary", msg)
 
+    def on_export_reports(self):
+        """Write HTML reports for the last 12 months on a worker thread."""
+        if self._report_job is not None:
+            return
+        today = date.today()
+        months = []
+        for back in range(12):
+            y, m = divmod(today.year * 12 + today.month - 1 - back, 12)
+            months.append(f"{y:04d}-{m + 1:02d}")
+
+        # this month's advice needs the live forecast, so build it here
+        mkey = current_month_key()
+        notes = {}
+        budget = self.budgets.get(mkey)
+        if budget is not None:
+            spent, cat_totals = self.current_month_totals()
+            forecast = self.month_forecast(budget)
+            notes[mkey] = self.build_advice(budget - spent, cat_totals, forecast, budget)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        pool = ThreadPoolExecutor(max_workers=1)
+        rules = RecurringRules(list(self.rules.rules))
+        self._report_job = pool.submit(
+            generate_reports, months, rules, self.build_advice, notes
+        )
+        pool.shutdown(wait=False)
+        self.btn_reports.configure(text="Saving reports…", state="disabled")
+        self.root.after(200, self._poll_report_job)
+
+    def _poll_report_job(self):
+        job = self._report_job
+        if not job.done():
+            self.root.after(200, self._poll_report_job)
+            return
+        self._report_job = None
+        self.btn_reports.configure(text="Save Reports (last 12 months)", state="normal")
+        try:
+            paths = job.result()
+        except Exception as e:
+            print("Error writing reports:", e)
+            messagebox.showerror("Reports", f"Could not write reports: {e}")
+            return
+        messagebox.showinfo(
+            "Reports",
+            f"Saved {len(paths)} reports to {os.path.abspath(REPORT_DIR)}.",
+        )
+
     # ---------- Budget helpers ---------- #
 
+    def analytics(self):
+        version = (self.store.version, self.rules.version)
+        if self._analytics is None or self._analytics[0] != version:
+            rows = self.expenses
+            first = self.rules.first_start()
+            if first is not None:
+                # past occurrences only; the future series is never built
+                rows = rows + self.rules.rows(first, date.today())
+            self._analytics = (version, AnalyticsEngine(rows))
+        return self._analytics[1]
+
     def current_month_totals(self):
         today = date.today()
-        y, m = today.year, today.month
-        total = 0.0
-        per_cat = {}
-        for exp in self.expenses:
-            try:
-                ey, em = month_from_str(exp.get("date", "01-01-2000"))
-            except Exception:
+        per_cat = self.cube.category_totals(current_month_key())
+        start, _ = month_bounds(today.year, today.month)
+        for cat, paise in self.rules.totals(start, today).items():
+            per_cat[cat] = per_cat.get(cat, 0) + paise
+        return sum(per_cat.values()), per_cat
+
+    def period_totals(self, period):
+        """(spent, {category: paise}) for a Period from the cube.
+
+        Recurring occurrences count up to today, as for the current month.
+        """
+        per_cat = self.cube.period_totals(period.months())
+        start, end = period.bounds()
+        end = min(end, date.today())
+        if start <= end and self.rules.rules:
+            for cat, paise in self.rules.totals(start, end).items():
+                per_cat[cat] = per_cat.get(cat, 0) + paise
+        return sum(per_cat.values()), per_cat
+
+    def category_spent(self, month, category):
+        """Spend in a category subtree for a month, plus recurring rows."""
+        spent = self.cube.subtree(month, category)
+        y, m = (int(part) for part in month.split("-"))
+        start, end = month_bounds(y, m)
+        end = min(end, date.today())
+        if start <= end and self.rules.rules:
+            per_cat = self.rules.totals(start, end)
+            spent += category_rollup(per_cat).get(category, 0)
+        return spent
+
+    def check_category_limit(self, exp):
+        """Messages for each limit ``exp`` pushed past a threshold.
+
+        A limit on "Food" also counts "Food/Groceries", so every ancestor
+        of the row's category is checked.
+        """
+        messages = []
+        month = shard_month(exp)
+        for category in CATEGORIES.ancestors(exp.get("category", "Other")):
+            if category not in self.limits.limits:
                 continue
-            if ey == y and em == m:
-                amt = float(exp.get("amount", 0))
-                total += amt
-                cat = exp.get("category", "Other")
-                per_cat[cat] = per_cat.get(cat, 0) + amt
-        return total, per_cat
-
-    def build_advice(self, diff, cat_totals):
+            after = self.category_spent(month, category)
+            level = self.limits.crossed(category, after - base_paise(exp), after)
+            if level is None:
+                continue
+            limit = self.limits.limits[category]["paise"]
+            if level == "alert":
+                messages.append(
+                    f"'{category}' is over its {format_money(limit, 0)} budget "
+                    f"({format_money(after, 0)} spent)."
+                )
+            else:
+                messages.append(
+                    f"'{category}' has used {100 * after // limit}% of its "
+                    f"{format_money(limit, 0)} budget."
+                )
+        return messages
+
+    def month_forecast(self, budget):
+        today = date.today()
+        start, end = month_bounds(today.year, today.month)
+        done = sum(self.rules.totals(start, today).values())
+        upcoming = 0
+        if today < end:
+            tomorrow = today + timedelta(days=1)
+            upcoming = sum(self.rules.totals(tomorrow, end).values())
+        return self.burn_rate.forecast(
+            budget, recurring_spent=done, upcoming=upcoming
+        )
+
+    @staticmethod
+    def anomaly_text(anomaly):
+        usual = f"your usual '{anomaly.category}' spend"
+        if anomaly.weekday is not None:
+            usual += f" on a {calendar.day_name[anomaly.weekday]}"
+        return (
+            f"{format_money(anomaly.paise, 0)} is well above {usual} "
+            f"(about {format_money(anomaly.typical, 0)})."
+        )
+
+    @staticmethod
+    def build_advice(diff, cat_totals, forecast=None, budget=None):
         if not cat_totals:
             return "Start logging your expenses so I can analyse where money goes."
 
         top_cat = max(cat_totals, key=lambda c: cat_totals[c])
         top_val = cat_totals[top_cat]
 
+        if (
+            diff > 0
+            and forecast is not None
+            and budget is not None
+            and forecast.projected > budget
+        ):
+            rates = forecast.category_rates or {top_cat: 0}
+            driver = max(rates, key=lambda c: rates[c])
+            return (
+                f"Heads up: at {format_money(forecast.daily_rate, 0)}/day "
+                f"you'll reach {format_money(forecast.projected, 0)} by month "
+                f"end, {format_money(forecast.projected - budget, 0)} over "
+                f"budget. Keep to {format_money(forecast.safe_per_day, 0)}/day "
+                f"and go easy on '{driver}'."
+            )
+
         if diff < 0:
             return (
-                f"Most of your spending is on '{top_cat}' (₹{top_val:.0f}). "
+                f"Most of your spending is on '{top_cat}' "
+                f"({format_money(top_val, 0)}). "
                 f"Cut that category first or find cheaper alternatives."
             )
-        elif abs(diff) < 0.01:
+        elif diff == 0:
             return (
                 f"You're perfectly on budget. Still, keep an eye on '{top_cat}', "
                 f"as it's your highest expense category."
@@ -617,79 +4898,357 @@ class ExpenseAppCTk:
         else:
             return (
                 f"Nice! You're under budget. Your biggest spending is '{top_cat}' "
-                f"(₹{top_val:.0f}). If you control this, you'll save even more."
+                f"({format_money(top_val, 0)}). "
+                f"If you control this, you'll save even more."
             )
 
-    def update_budget_status(self):
+    def _render_frame(self):
+        """Aggregates shared by every part redrawn in one pass."""
+        return {"month_totals": self.current_month_totals()}
+
+    def update_budget_status(self, frame=None):
         month_name = date.today().strftime("%B %Y")
-        spent, cat_totals = self.current_month_totals()
+        if frame is None:
+            frame = self._render_frame()
+        spent, cat_totals = frame["month_totals"]
         budget = self.budgets.get(current_month_key())
 
+        self._update_limits_label(category_rollup(cat_totals))
+
+        forecast = self.month_forecast(budget)
+        projected = format_money(forecast.projected)
+        forecast_text = f"Projected month-end spend: {projected}"
+        if forecast.safe_per_day is not None:
+            safe = format_money(forecast.safe_per_day)
+            forecast_text += f" · Safe to spend: {safe}/day"
+        self.forecast_label.configure(text=forecast_text)
+
+        # flagged only while that expense still exists
+        alert = ""
+        if self.last_anomaly is not None:
+            if self.last_anomaly[0] in self.store.by_key:
+                alert = f"Unusual: {self.last_anomaly[1]}\n"
+            else:
+                self.last_anomaly = None
+
         if budget is None:
             text = f"No budget set for {month_name}."
             self.budget_status_label.configure(text=text, text_color=self.TEXT_SUB)
             self.advice_label.configure(
-                text="Set a budget and add some expenses. I'll tell you where to cut costs."
+                text=alert + "Set a budget and add some expenses. "
+                "I'll tell you where to cut costs."
             )
             return
 
         diff = budget - spent
-        if abs(diff) < 0.01:
+        if diff == 0:
             color = self.YELLOW
-            text = f"{month_name}: On budget (₹{budget:.2f})."
+            text = f"{month_name}: On budget ({format_money(budget)})."
         elif diff > 0:
             color = self.GREEN
             text = (
-                f"{month_name}: Under budget by ₹{diff:.2f} "
-                f"(Budget ₹{budget:.2f}, Spent ₹{spent:.2f})."
+                f"{month_name}: Under budget by {format_money(diff)} "
+                f"(Budget {format_money(budget)}, Spent {format_money(spent)})."
             )
         else:
             color = self.RED
             text = (
-                f"{month_name}: Over budget by ₹{abs(diff):.2f} "
-                f"(Budget ₹{budget:.2f}, Spent ₹{spent:.2f})."
+                f"{month_name}: Over budget by {format_money(-diff)} "
+                f"(Budget {format_money(budget)}, Spent {format_money(spent)})."
             )
 
+        if diff > 0 and forecast.projected > budget:
+            color = self.YELLOW
         self.budget_status_label.configure(text=text, text_color=color)
-        advice = self.build_advice(diff, cat_totals)
-        self.advice_label.configure(text=advice)
+        advice = self.build_advice(diff, cat_totals, forecast, budget)
+        self.advice_label.configure(text=alert + advice)
+
+    def _update_stats_view(self, frame):
+        if self._stats_view is None:
+            return
+        win, chart, total_label, period, totals, heatmap = self._stats_view
+        if not win.winfo_exists():
+            self._stats_view = None
+            return
+        current = Period.containing("month", date.today())
+        if period == current and totals == self.period_totals:
+            spent, per_cat = frame["month_totals"]
+        else:
+            spent, per_cat = totals(period)
+        chart.update(per_cat, self._category_color)
+        total_label.configure(text=f"Total spent: {format_money(spent)}")
+        if heatmap is not None:
+            self._update_heatmap(heatmap)
+
+    def day_spend(self, year):
+        """{date: paise} for a year from the day index plus recurring rows.
+
+        With a filter set, only the matching rows are counted.
+        """
+        if self.query_text:
+            values, rows = {}, self.query_rows()
+        else:
+            values = self.day_totals.year(year)
+            first, last = date(year, 1, 1), min(date(year, 12, 31), date.today())
+            rows = self.rules.rows(first, last) if first <= last else []
+        for exp in rows:
+            day = _row_day(exp)
+            if day is not None and day.year == year:
+                values[day] = values.get(day, 0) + base_paise(exp)
+        return values
+
+    def _draw_heatmap(self, heatmap):
+        self.day_totals.take_dirty()
+        heatmap.draw(self.day_spend(heatmap.year))
+        heatmap.stamp = (self.query_text, self.rules.version)
+
+    def _update_heatmap(self, heatmap):
+        """Recolour the days that changed; redraw if rules or filter did."""
+        if self.query_text or heatmap.stamp != (self.query_text, self.rules.version):
+            self._draw_heatmap(heatmap)
+            return
+        today = date.today()
+        for day in self.day_totals.take_dirty():
+            if day.year == heatmap.year:
+                paise = self.day_totals.days.get(day, 0)
+                if day <= today:
+                    paise += sum(base_paise(e) for e in self.rules.rows(day, day))
+                heatmap.set_day(day, paise)
+
+    def _update_limits_label(self, cat_totals):
+        lines = []
+        color = self.TEXT_SUB
+        for cat, spent, limit, level in self.limits.status(cat_totals):
+            mark = {"alert": "⚠ ", "warn": "• "}.get(level, "")
+            if level == "alert":
+                color = self.RED
+            lines.append(
+                f"{mark}{cat}: {format_money(spent, 0)} / {format_money(limit, 0)}"
+            )
+        self.limits_label.configure(
+            text="\n".join(lines) or "No category budgets yet.",
+            text_color=color,
+        )
 
     # ---------- History rendering ---------- #
 
+    def _history_rows(self):
+        """Rows the history pages through, newest first."""
+        if self.query_text:
+            return list(reversed(self.query_rows()))
+        return list(reversed(self.expenses))
+
     def refresh_history(self):
         for child in self.history_list.winfo_children():
             child.destroy()
+        self._history_cards = {}
+        self._thumb_slots = {}
+        self._sections = {}
+
+        groups = {}
+        # a filter already covers the recurring rows it matches
+        if self.history_anchor is None and not self.query_text:
+            # this month's recurring charges so far, above the real rows
+            today = date.today()
+            first, _ = month_bounds(today.year, today.month)
+            groups[current_month_key()] = list(reversed(self.rules.rows(first, today)))
+
+        rows = self._history_rows()
+        start = 0
+        if self.history_cap is not None and self.history_anchor is not None:
+            keys = [record_key(e) for e in rows]
+            if self.history_anchor in keys:
+                start = keys.index(self.history_anchor)
+        page = rows
+        if self.history_cap is not None:
+            page = rows[start:start + self.history_cap]
+
+        for exp in page:
+            groups.setdefault(shard_month(exp), []).append(exp)
+        # newest month first, undated rows last
+        for month in sorted(groups, key=lambda m: (m != UNDATED_SHARD, m), reverse=True):
+            self._add_history_section(month, groups[month])
+        self._update_history_total()
+        self._update_history_nav(start, len(page), len(rows))
+
+    def _add_history_section(self, month, rows):
+        """Header for one month; its cards are built only when expanded."""
+        frame = ctk.CTkFrame(self.history_list, fg_color="transparent")
+        frame.pack(fill="x")
+        header = ctk.CTkButton(
+            frame,
+            text="",
+            command=lambda: self.toggle_history_section(month),
+            anchor="w",
+            fg_color="transparent",
+            hover_color="#0f172a",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 11, "bold"),
+            corner_radius=10,
+            height=28,
+        )
+        header.pack(fill="x", pady=(4, 0))
+        body = ctk.CTkFrame(frame, fg_color="transparent")
+        self._sections[month] = {
+            "header": header, "body": body, "rows": rows, "built": False,
+        }
+        if month in self._expanded_months:
+            self._build_history_section(month)
+        self._label_history_section(month)
+
+    def _build_history_section(self, month):
+        section = self._sections[month]
+        section["body"].pack(fill="x")
+        for exp in section["rows"]:
+            self._add_history_card(exp, parent=section["body"])
+        section["built"] = True
+
+    def toggle_history_section(self, month):
+        section = self._sections.get(month)
+        if section is None:
+            return
+        if section["built"]:
+            self._expanded_months.discard(month)
+            for exp in section["rows"]:
+                self._history_cards.pop(id(exp), None)
+            for child in section["body"].winfo_children():
+                child.destroy()
+            section["body"].pack_forget()
+            section["built"] = False
+        else:
+            self._expanded_months.add(month)
+            self._build_history_section(month)
+        self._label_history_section(month)
+
+    def _listed_recurring(self, month):
+        """Spend of the recurring cards a section lists (this month's)."""
+        rows = self._sections[month]["rows"]
+        return sum(base_paise(e) for e in rows if e.get("recurring"))
+
+    def _section_total(self, month):
+        """A month's spend from the aggregates (or its rows when filtered).
+
+        Recurring occurrences count only where the section lists them,
+        the same basis as the grand total above the list.
+        """
+        if self.query_text:
+            return sum(base_paise(e) for e in self._sections[month]["rows"])
+        return self.cube.total(month) + self._listed_recurring(month)
+
+    def _label_history_section(self, month):
+        section = self._sections[month]
+        name = "Undated"
+        if month != UNDATED_SHARD:
+            name = datetime.strptime(month, "%Y-%m").strftime("%B %Y")
+        arrow = "▾" if section["built"] else "▸"
+        count = len(section["rows"])
+        section["header"].configure(
+            text=f"{arrow} {name} · {format_money(self._section_total(month))} "
+            f"· {count} {'entry' if count == 1 else 'entries'}"
+        )
+
+    def _update_history_nav(self, start, shown, resident):
+        self.btn_newer.pack_forget()
+        self.btn_older.pack_forget()
+        if self.history_cap is None:
+            return
 
-        total = 0.0
-        for exp in reversed(self.expenses):
-            total += float(exp.get("amount", 0))
-            self._add_history_card(exp)
+        if start > 0:
+            self.btn_newer.pack(side="left")
+        more = start + shown < resident or self.pager.older_month() is not None
+        if more:
+            self.btn_older.pack(side="right")
 
-        self.total_label.configure(text=f"Total: ₹{total:.2f}")
+        report = memory_report(
+            self.store, self.pager, len(self._history_cards), self.render
+        )
+        text = (
+            f"{report['history_cards']} cards · {report['resident_rows']} rows "
+            f"in {report['resident_months']} months"
+        )
+        if report["rss_mb"] is not None:
+            text += f" · {report['rss_mb']:.0f} MB"
+        if report["redraws_coalesced"]:
+            text += f" · {report['redraws_coalesced']} redraws saved"
+        self.history_hint.configure(text=text)
+
+    def on_history_older(self):
+        rows = self._history_rows()
+        keys = [record_key(e) for e in rows]
+        start = 0
+        if self.history_anchor in keys:
+            start = keys.index(self.history_anchor)
+        nxt = start + self.history_cap
+        if nxt >= len(rows):
+            month = self.pager.older_month()
+            if month is None:
+                return
+            last_shown = keys[-1] if keys else None
+            self.pager.ensure(month)
+            rows = self._history_rows()
+            keys = [record_key(e) for e in rows]
+            nxt = keys.index(last_shown) + 1 if last_shown in keys else 0
+        self.history_anchor = keys[nxt] if nxt < len(keys) else None
+        self.render.mark("history")
+
+    def on_history_newer(self):
+        keys = [record_key(e) for e in self._history_rows()]
+        start = keys.index(self.history_anchor) if self.history_anchor in keys else 0
+        start = max(0, start - self.history_cap)
+        self.history_anchor = keys[start] if keys else None
+        self.render.mark("history")
+
+    def _update_history_total(self):
+        if self.query_text:
+            rows = self.query_rows()
+            total = format_money(sum(base_paise(e) for e in rows))
+            self.total_label.configure(text=f"{len(rows)} matches: {total}")
+            for month in self._sections:
+                self._label_history_section(month)
+            return
+        listed = sum(self._listed_recurring(month) for month in self._sections)
+        total = format_money(self.cube.grand_total + listed)
+        self.total_label.configure(text=f"Total: {total}")
+        for month in self._sections:
+            self._label_history_section(month)
+
+    def _remove_history_card(self, exp):
+        section = self._sections.get(shard_month(exp))
+        if section is not None:
+            section["rows"] = [e for e in section["rows"] if e is not exp]
+        card = self._history_cards.pop(id(exp), None)
+        if card is None:
+            return
+        card.destroy()
+
+    def _insert_history_row(self, exp):
+        """Show a new row in its month section; False if there is none."""
+        section = self._sections.get(shard_month(exp))
+        if section is None:
+            return False
+        section["rows"].insert(0, exp)
+        if section["built"]:
+            self._add_history_card(exp, at_top=True, parent=section["body"])
+        return True
 
     def _category_color(self, cat):
-        c = cat.lower()
-        if "food" in c:
-            return "#4ade80"  # green
-        if "travel" in c or "fuel" in c:
-            return "#38bdf8"  # blue
-        if "bill" in c or "rent" in c:
-            return "#eab308"  # yellow
-        if "entertain" in c or "party" in c:
-            return "#a855f7"  # purple
-        if "shop" in c:
-            return "#f97316"  # orange
-        return self.BLUE
-
-    def _add_history_card(self, exp):
+        return CATEGORIES.style(cat).color
+
+    def _add_history_card(self, exp, at_top=False, parent=None):
+        parent = parent or self.history_list
         card = ctk.CTkFrame(
-            self.history_list,
+            parent,
             fg_color="#020617",
             border_width=1,
             border_color=self.CARD_BORDER,
             corner_radius=14,
         )
-        card.pack(fill="x", pady=4)
+        packed = parent.pack_slaves()
+        if at_top and packed:
+            card.pack(fill="x", pady=4, before=packed[0])
+        else:
+            card.pack(fill="x", pady=4)
+        self._history_cards[id(exp)] = card
 
         top_row = ctk.CTkFrame(card, fg_color="transparent")
         top_row.pack(fill="x", padx=8, pady=(4, 0))
@@ -704,7 +5263,7 @@ class ExpenseAppCTk:
 
         lbl_amount = ctk.CTkLabel(
             top_row,
-            text=f"₹{float(exp.get('amount', 0)):.2f}",
+            text=row_money(exp),
             text_color=self.ORANGE,
             font=("Inter", 11, "bold"),
         )
@@ -713,16 +5272,19 @@ class ExpenseAppCTk:
         mid_row = ctk.CTkFrame(card, fg_color="transparent")
         mid_row.pack(fill="x", padx=8, pady=(2, 0))
 
-        cat_color = self._category_color(exp.get("category", "Other"))
+        cat_style = CATEGORIES.style(exp.get("category", "Other"))
         lbl_cat = ctk.CTkLabel(
             mid_row,
-            text=exp.get("category", "Other"),
-            text_color=cat_color,
+            text=f"{cat_style.name} ↻" if exp.get("recurring") else cat_style.name,
+            text_color=cat_style.color,
             font=("Inter", 10, "bold"),
         )
         lbl_cat.pack(anchor="w")
 
         note_text = exp.get("note") or ""
+        if exp.get("tags"):
+            tag_text = " ".join(f"#{t}" for t in exp["tags"])
+            note_text = f"{note_text}  {tag_text}" if note_text else tag_text
         if note_text:
             lbl_note = ctk.CTkLabel(
                 card,
@@ -734,11 +5296,72 @@ class ExpenseAppCTk:
             )
             lbl_note.pack(anchor="w", padx=8, pady=(0, 6))
 
+        if exp.get("receipt"):
+            # the thumbnail is only asked for once the row is on screen
+            slot = tk.Label(
+                card,
+                text="📎 Receipt",
+                compound="left",
+                bg="#020617",
+                fg=self.BLUE,
+                cursor="hand2",
+            )
+            slot.pack(anchor="w", padx=8, pady=(0, 6))
+            path = os.path.abspath(self.receipts.path(exp["receipt"]))
+            slot.bind("<Button-1>", lambda e: self.open_receipt(path))
+            slot.bind("<Map>", self._schedule_thumb_check)
+            self._thumb_slots[slot] = exp["receipt"]
+
+    @staticmethod
+    def open_receipt(path):
+        if not os.path.exists(path):
+            messagebox.showinfo("Receipt", "This receipt is not on this device.")
+            return
+        webbrowser.open(Path(path).as_uri())
+
+    def _schedule_thumb_check(self, event=None):
+        if self._thumb_slots and not self._thumb_check:
+            self._thumb_check = True
+            self.root.after_idle(self._load_visible_thumbnails)
+
+    def _load_visible_thumbnails(self):
+        """Start thumbnails for receipt rows inside the window's viewport."""
+        self._thumb_check = False
+        top = self.root.winfo_rooty()
+        bottom = top + self.root.winfo_height()
+        for slot, key in list(self._thumb_slots.items()):
+            if not slot.winfo_exists():
+                del self._thumb_slots[slot]
+                continue
+            y = slot.winfo_rooty()
+            if slot.winfo_ismapped() and y < bottom and y + slot.winfo_height() > top:
+                del self._thumb_slots[slot]
+                if not self._thumb_jobs:
+                    self.root.after(100, self._poll_thumbnails)
+                self._thumb_jobs.append((slot, self.receipts.thumbnail(key)))
+
+    def _poll_thumbnails(self):
+        waiting = []
+        for slot, job in self._thumb_jobs:
+            if not job.done():
+                waiting.append((slot, job))
+                continue
+            try:
+                path = job.result()
+            except Exception as e:
+                print("Error making thumbnail:", e)
+                continue
+            if path and slot.winfo_exists():
+                slot.image = tk.PhotoImage(file=path)  # label holds no reference
+                slot.configure(image=slot.image, text="")
+        self._thumb_jobs = waiting
+        if waiting:
+            self.root.after(100, self._poll_thumbnails)
+
     # ---------- Stats window (graphs) ---------- #
 
-    def open_stats_window(self):
-        spent, per_cat = self.current_month_totals()
-        month_name = date.today().strftime("%B %Y")
+    def open_stats_window(self, period=None):
+        period = period or Period.containing("month", date.today())
 
         # FULLSCREEN WINDOW (mobile style)
         win = ctk.CTkToplevel(self.root)
@@ -751,10 +5374,14 @@ class ExpenseAppCTk:
         header = ctk.CTkFrame(win, fg_color=self.BG)
         header.pack(fill="x", padx=16, pady=(16, 8))
 
+        def close():
+            self._stats_view = None
+            win.destroy()
+
         close_btn = ctk.CTkButton(
             header,
             text="← Back",
-            command=win.destroy,
+            command=close,
             fg_color="#020617",
             hover_color="#0f172a",
             text_color=self.TEXT_MAIN,
@@ -766,12 +5393,21 @@ class ExpenseAppCTk:
 
         title = ctk.CTkLabel(
             header,
-            text=f"Stats · {month_name}",
+            text=f"Stats · {period.label()}",
             text_color=self.TEXT_MAIN,
             font=("Inter", 20, "bold")
         )
         title.pack(side="left", padx=16)
 
+        # Period controls: ‹ [Month|Quarter|Year] › and a compare switch
+        controls = ctk.CTkFrame(win, fg_color=self.BG)
+        controls.pack(fill="x", padx=16, pady=(0, 8))
+
+        kind_var = ctk.StringVar(value=period.kind.title())
+        compare_var = ctk.BooleanVar(value=False)
+        combined_var = ctk.BooleanVar(value=False)
+        state = {"period": period}
+
         # Scrollable content
         body = ctk.CTkScrollableFrame(
             win,
@@ -779,20 +5415,91 @@ class ExpenseAppCTk:
             width=380,
             height=700
         )
+
+        def show(new_period):
+            state["period"] = new_period
+            title.configure(text=f"Stats · {new_period.label()}")
+            self._fill_stats_body(
+                win, body, new_period, compare_var.get(), combined_var.get()
+            )
+
+        def on_kind(choice):
+            show(Period.containing(choice.lower(), state["period"].bounds()[0]))
+
+        for text, step in (("‹", -1), ("›", 1)):
+            ctk.CTkButton(
+                controls,
+                text=text,
+                command=lambda step=step: show(state["period"].shift(step)),
+                fg_color="#020617",
+                hover_color="#0f172a",
+                border_width=1,
+                border_color=self.CARD_BORDER,
+                text_color=self.TEXT_MAIN,
+                corner_radius=40,
+                height=30,
+                width=36
+            ).pack(side="left" if step < 0 else "right")
+
+        kind_menu = ctk.CTkSegmentedButton(
+            controls,
+            values=[k.title() for k in Period.KINDS],
+            variable=kind_var,
+            command=on_kind,
+            font=("Inter", 11)
+        )
+        kind_menu.pack(side="left", padx=8)
+
+        compare = ctk.CTkSwitch(
+            controls,
+            text="Compare",
+            variable=compare_var,
+            command=lambda: show(state["period"]),
+            text_color=self.TEXT_SUB,
+            font=("Inter", 11)
+        )
+        compare.pack(side="left", padx=8)
+
+        if len(self.ledgers.names()) > 1:
+            combined = ctk.CTkSwitch(
+                controls,
+                text="All ledgers",
+                variable=combined_var,
+                command=lambda: show(state["period"]),
+                text_color=self.TEXT_SUB,
+                font=("Inter", 11)
+            )
+            combined.pack(side="left", padx=8)
+
         body.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self._fill_stats_body(win, body, period, False)
+
+    def _fill_stats_body(self, win, body, period, compare=False, combined=False):
+        for child in body.winfo_children():
+            child.destroy()
+        self._stats_view = None
+        totals = self.combined_totals if combined else self.period_totals
+        scope = "all ledgers" if combined else self.ledgers.active
+        if self.query_text and not combined:
+            totals = self.query_totals
+            scope += f" · {self.query_text}"
+        spent, per_cat = totals(period)
 
         subtitle = ctk.CTkLabel(
             body,
-            text="Category-wise breakdown for this month",
+            text=f"Category-wise breakdown for {period.label()} · {scope}",
             text_color=self.TEXT_SUB,
             font=("Inter", 12)
         )
         subtitle.pack(anchor="w", padx=10, pady=(4, 12))
 
+        if compare:
+            self._build_compare_card(body, period, spent, per_cat, totals)
+
         if not per_cat:
             msg = ctk.CTkLabel(
                 body,
-                text="No expenses for this month yet.",
+                text=f"No expenses for {period.label()}.",
                 text_color=self.TEXT_SUB,
                 font=("Inter", 13),
             )
@@ -816,94 +5523,440 @@ class ExpenseAppCTk:
             highlightthickness=0,
             height=canvas_h
         )
-        canvas.pack(fill="x", padx=10, pady=10)
+        canvas.pack(fill="x", padx=10, pady=(10, 0))
+
+        scrollbar = ctk.CTkScrollbar(chart_card, orientation="horizontal", height=12)
+        scrollbar.pack(fill="x", padx=10, pady=(0, 6))
+
+        chart = BarChart(
+            canvas,
+            canvas_h,
+            top_n=self.CHART_TOP_N,
+            text_color=self.TEXT_MAIN,
+            sub_color=self.TEXT_SUB,
+        )
+        chart.attach_scrollbar(scrollbar)
+        chart.update(per_cat, self._category_color)
+
+        # Total display
+        total_label = ctk.CTkLabel(
+            chart_card,
+            text=f"Total spent: {format_money(spent)}",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        total_label.pack(anchor="w", padx=12, pady=(8, 4))
+
+        heatmap = None
+        if not combined:
+            heatmap = self._build_heatmap_card(body, period.bounds()[0].year)
 
-        # Prepare graph data
-        categories = list(per_cat.keys())
-        values = [per_cat[c] for c in categories]
-        max_val = max(values)
+        # kept current by the render scheduler while the window is open
+        self._stats_view = (win, chart, total_label, period, totals, heatmap)
+
+        # Category tree (the full list, not the folded chart); each node
+        # shows its whole subtree, straight from the rollups
+        tree, tags = self.period_rollups(period, combined)
+        for node in tree_order(tree):
+            depth = node.count(CATEGORY_SEP)
+            name = node.rsplit(CATEGORY_SEP, 1)[-1]
+            line = ctk.CTkLabel(
+                chart_card,
+                text=f"{name}: {format_money(tree[node])}",
+                text_color=self.TEXT_SUB if depth else self.TEXT_MAIN,
+                font=("Inter", 12)
+            )
+            line.pack(anchor="w", padx=(12 + 16 * depth, 12), pady=(0, 2))
 
-        # Graph layout (mobile optimized)
-        left_margin = 50
-        right_margin = 20
-        bottom = canvas_h - 40
-        top = 40
+        if tags:
+            self._build_tags_card(body, tags)
+        if period.kind == "month" and totals == self.period_totals:
+            self._build_limits_card(body, tree)  # limits are monthly
+        self._build_insights_card(body, period)
+        self._build_recurring_card(body)
 
-        usable_width = 340
-        num = len(categories)
-        bar_space = usable_width / max(num, 1)
-        bar_width = bar_space * 0.45
+    def _build_heatmap_card(self, parent, year):
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
 
-        # X-axis
-        canvas.create_line(
-            left_margin,
-            bottom,
-            left_margin + usable_width,
-            bottom,
-            fill="#1f2937",
-            width=2
+        title = ctk.CTkLabel(
+            card,
+            text=f"Daily spend · {year}",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        title.pack(anchor="w", padx=12, pady=(10, 4))
+
+        height = CalendarHeatmap.TOP + 7 * (CalendarHeatmap.CELL + CalendarHeatmap.GAP)
+        canvas = tk.Canvas(card, bg="#020617", highlightthickness=0, height=height)
+        canvas.pack(fill="x", padx=10)
+        scrollbar = ctk.CTkScrollbar(card, orientation="horizontal", height=12)
+        scrollbar.pack(fill="x", padx=10, pady=(2, 0))
+        canvas.configure(xscrollcommand=scrollbar.set)
+        scrollbar.configure(command=canvas.xview)
+
+        picked = ctk.CTkLabel(
+            card,
+            text="Tap a day for its total.",
+            text_color=self.TEXT_SUB,
+            font=("Inter", 11)
         )
+        picked.pack(anchor="w", padx=12, pady=(2, 8))
+
+        def on_pick(day, paise):
+            picked.configure(text=f"{day.strftime('%a %d %b')}: {format_money(paise)}")
 
-        # Draw bars
-        for i, cat in enumerate(categories):
-            value = values[i]
-            height_ratio = value / max_val if max_val else 0
+        heatmap = CalendarHeatmap(canvas, year, self.TEXT_SUB, on_pick)
+        self._draw_heatmap(heatmap)
+        if year == date.today().year:
+            # open on the recent weeks
+            canvas.xview_moveto(max(0.0, date.today().timetuple().tm_yday / 366 - 0.5))
+        return heatmap
 
-            x_center = left_margin + bar_space * (i + 0.5)
-            bar_height = (bottom - top) * height_ratio
+    def _build_compare_card(self, parent, period, spent, per_cat, totals):
+        """This period next to the one before it, category by category."""
+        before = period.shift(-1)
+        old_spent, old_cat = totals(before)
 
-            x0 = x_center - bar_width / 2
-            x1 = x_center + bar_width / 2
-            y1 = bottom
-            y0 = bottom - bar_height
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
 
-            color = self._category_color(cat)
+        title = ctk.CTkLabel(
+            card,
+            text=f"{period.label()} vs {before.label()}",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        title.pack(anchor="w", padx=12, pady=(10, 4))
+
+        def row(name, now, then, bold=False):
+            line = ctk.CTkFrame(card, fg_color="transparent")
+            line.pack(fill="x", padx=12, pady=(0, 2))
+            font = ("Inter", 12, "bold") if bold else ("Inter", 12)
+            change = ""
+            if then:
+                change = f"{100 * (now - then) / then:+.0f}%"
+            color = self.RED if now > then else self.GREEN
+            for text, side, fg in (
+                (name, "left", self.TEXT_MAIN),
+                (change, "right", color),
+                (format_money(then, 0), "right", self.TEXT_SUB),
+                (format_money(now, 0), "right", self.TEXT_MAIN),
+            ):
+                ctk.CTkLabel(
+                    line, text=text, text_color=fg, font=font, width=70
+                ).pack(side=side, padx=(0, 4))
+
+        row("Total", spent, old_spent, bold=True)
+        for cat in sorted(set(per_cat) | set(old_cat), key=lambda c: -per_cat.get(c, 0)):
+            row(cat, per_cat.get(cat, 0), old_cat.get(cat, 0))
+        ctk.CTkFrame(card, fg_color="transparent", height=6).pack()
+
+    def _build_tags_card(self, parent, tags):
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
 
-            canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline=color)
+        title = ctk.CTkLabel(
+            card,
+            text="Tags",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        title.pack(anchor="w", padx=12, pady=(10, 4))
 
-            # Amount on top of bar
-            canvas.create_text(
-                x_center,
-                y0 - 10,
-                text=f"₹{value:.0f}",
-                fill=self.TEXT_MAIN,
-                font=("Inter", 10)
+        for tag in sorted(tags, key=lambda t: (-tags[t], t)):
+            line = ctk.CTkLabel(
+                card,
+                text=f"#{tag}: {format_money(tags[tag])}",
+                text_color=self.TEXT_SUB,
+                font=("Inter", 12)
             )
+            line.pack(anchor="w", padx=12, pady=(0, 2))
+        ctk.CTkFrame(card, fg_color="transparent", height=6).pack()
 
-            # Category name below bar
-            canvas.create_text(
-                x_center,
-                bottom + 14,
-                text=cat,
-                fill=self.TEXT_SUB,
-                font=("Inter", 10),
-                anchor="n"
+    def _build_limits_card(self, parent, per_cat):
+        status = self.limits.status(per_cat)
+        if not status:
+            return
+
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
+
+        title = ctk.CTkLabel(
+            card,
+            text="Category budgets",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        title.pack(anchor="w", padx=12, pady=(10, 4))
+
+        colors = {"alert": self.RED, "warn": self.YELLOW, None: self.GREEN}
+        for cat, spent, limit, level in status:
+            line = ctk.CTkLabel(
+                card,
+                text=f"{cat}: {format_money(spent)} of {format_money(limit)}",
+                text_color=self.TEXT_SUB,
+                font=("Inter", 12)
             )
+            line.pack(anchor="w", padx=12)
 
-        # Total display
-        total_label = ctk.CTkLabel(
-            chart_card,
-            text=f"Total spent this month: ₹{spent:.2f}",
+            bar = ctk.CTkProgressBar(
+                card,
+                progress_color=colors[level],
+                fg_color=self.CARD_BORDER,
+                height=8
+            )
+            bar.set(min(spent / limit, 1.0) if limit else 1.0)
+            bar.pack(fill="x", padx=12, pady=(2, 8))
+
+    def _build_recurring_card(self, parent):
+        # A rule stopped today still counts today; list only those that recur.
+        rules = self.rules.active(date.today() + timedelta(days=1))
+        if not rules:
+            return
+
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
+
+        title = ctk.CTkLabel(
+            card,
+            text="Recurring",
             text_color=self.TEXT_MAIN,
             font=("Inter", 13, "bold")
         )
-        total_label.pack(anchor="w", padx=12, pady=(8, 4))
+        title.pack(anchor="w", padx=12, pady=(10, 4))
+
+        for rule in rules:
+            row = ctk.CTkFrame(card, fg_color="transparent")
+            row.pack(fill="x", padx=12, pady=(0, 4))
 
-        # Category totals list
-        for cat in categories:
-            val = per_cat[cat]
+            every = rule["freq"]
+            if rule["freq"] == "custom":
+                every = f"every {rule['interval']} days"
             line = ctk.CTkLabel(
-                chart_card,
-                text=f"{cat}: ₹{val:.2f}",
+                row,
+                text=f"{rule['category']}: {row_money(rule)} {every}",
                 text_color=self.TEXT_SUB,
                 font=("Inter", 12)
             )
+            line.pack(side="left")
+
+            def stop(rule_id=rule["id"], row=row):
+                self.on_stop_recurring(rule_id)
+                row.destroy()
+
+            stop_btn = ctk.CTkButton(
+                row,
+                text="Stop",
+                command=stop,
+                fg_color="#020617",
+                hover_color="#0f172a",
+                border_width=1,
+                border_color=self.CARD_BORDER,
+                text_color=self.RED,
+                font=("Inter", 10, "bold"),
+                corner_radius=40,
+                height=26,
+                width=60
+            )
+            stop_btn.pack(side="right")
+        ctk.CTkFrame(card, fg_color="transparent", height=6).pack()
+
+    def _build_insights_card(self, parent, period):
+        engine = self.analytics()
+        start, end = period.bounds()
+        end = min(end, date.today())
+        if start > end:
+            return
+
+        card = ctk.CTkFrame(
+            parent,
+            fg_color="#020617",
+            border_width=1,
+            border_color=self.CARD_BORDER,
+            corner_radius=18
+        )
+        card.pack(fill="x", padx=10, pady=(0, 14))
+
+        title = ctk.CTkLabel(
+            card,
+            text="Insights",
+            text_color=self.TEXT_MAIN,
+            font=("Inter", 13, "bold")
+        )
+        title.pack(anchor="w", padx=12, pady=(10, 4))
+
+        pct = engine.percentiles((50, 90), start, end)
+        burn = format_money(engine.daily_burn_rate(start, end))
+        lines = [
+            f"Daily burn rate: {burn}/day",
+            f"Typical expense: {format_money(pct[50], 0)} · "
+            f"90% under {format_money(pct[90], 0)}",
+        ]
+        top = engine.top_days(3)
+        if top:
+            days = ", ".join(
+                f"{d.strftime('%d %b %Y')} ({format_money(v, 0)})" for d, v in top
+            )
+            lines.append(f"Top days: {days}")
+
+        for text in lines:
+            line = ctk.CTkLabel(
+                card,
+                text=text,
+                text_color=self.TEXT_SUB,
+                font=("Inter", 12),
+                wraplength=340,
+                justify="left"
+            )
             line.pack(anchor="w", padx=12, pady=(0, 2))
+        ctk.CTkFrame(card, fg_color="transparent", height=8).pack()
 
 
 # ---------- main ---------- #
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SpendFlow expense tracker")
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="move the ledger to one file per month before starting",
+    )
+    parser.add_argument(
+        "--sync-serve",
+        metavar="HOST:PORT",
+        nargs="?",
+        const=f"127.0.0.1:{SYNC_PORT}",
+        help="serve delta sync for other devices instead of opening the app",
+    )
+    parser.add_argument(
+        "--sync-with",
+        metavar="HOST:PORT",
+        help="sync with a device running --sync-serve, then exit",
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        default=LOW_MEMORY,
+        help="page old months out of memory and cap the history list",
+    )
+    parser.add_argument(
+        "--history-cap",
+        type=int,
+        default=HISTORY_CAP,
+        help="history cards kept on screen in low-memory mode",
+    )
+    parser.add_argument(
+        "--import-rates",
+        metavar="CSV",
+        help="merge date,currency,rate lines into the local rate table, then exit",
+    )
+    parser.add_argument(
+        "--reports",
+        metavar="YYYY",
+        type=int,
+        help="write HTML reports for every month of a year, then exit",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check the ledger's segment checksums, then exit",
+    )
+    parser.add_argument(
+        "--ledger",
+        metavar="NAME",
+        default=DEFAULT_LEDGER,
+        help=f"ledger to use (created if missing; default {DEFAULT_LEDGER})",
+    )
+    parser.add_argument(
+        "--ledgers",
+        action="store_true",
+        help="list ledgers with this month's spend, then exit",
+    )
+    args = parser.parse_args(argv)
+    ledgers = LedgerSet()
+    if args.ledgers:
+        month = current_month_key()
+        total = 0
+        for name in ledgers.names():
+            spent = ledger_cube(ledgers.path(name)).total(month)
+            total += spent
+            print(f"{name}: {format_money(spent)}")
+        print(f"All ledgers: {format_money(total)}")
+        return
+    if args.import_rates:
+        # one rate table for every ledger, kept in the base directory
+        count = RATES.import_csv(args.import_rates)
+        RATES.save()
+        print(f"Imported {count} rates into {RATES_FILE}.")
+        return
+    try:
+        ledgers.activate(args.ledger)
+    except (OSError, ValueError) as e:
+        print("Cannot open ledger:", e)
+        return 2
+
+    if args.verify:
+        try:
+            report = verify_segments()
+        except (OSError, ValueError) as e:
+            print("Cannot verify:", e)
+            return 2
+        bad = report["damaged"]
+        print(f"{report['segments']} segments, {len(bad)} damaged.")
+        for lineno in bad:
+            print(f"  damaged segment on line {lineno}")
+        return 1 if bad else 0
+    if args.reports:
+        months = [f"{args.reports:04d}-{m:02d}" for m in range(1, 13)]
+        paths = generate_reports(
+            months, RecurringRules.load(), ExpenseAppCTk.build_advice
+        )
+        print(f"Wrote {len(paths)} reports to {REPORT_DIR}/")
+        return
+    if args.shard and migrate_to_shards():
+        print(f"Ledger moved into {SHARD_DIR}/")
+
+    if args.sync_serve or args.sync_with:
+        host, _, port = (args.sync_serve or args.sync_with).rpartition(":")
+        host, port = host or "127.0.0.1", int(port or SYNC_PORT)
+        if args.sync_serve:
+            asyncio.run(_serve_forever(host, port))
+        else:
+            result = asyncio.run(SyncPeer().sync_with(host, port))
+            print(f"Sent {result['sent']} changes, received {result['received']}.")
+        return
+
     root = ctk.CTk()
     root.withdraw()  # hide main while splash shows
 
@@ -912,11 +5965,11 @@ def main():
     def start_app():
         splash.destroy()
         root.deiconify()
-        ExpenseAppCTk(root)
+        ExpenseAppCTk(root, args.low_memory, max(1, args.history_cap), ledgers)
 
     root.after(1600, start_app)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
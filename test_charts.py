@@ -0,0 +1,76 @@
+"""Tests for the scrolling category ``BarChart`` on a fake canvas."""
+
+import pytest
+
+pytest.importorskip("customtkinter")
+
+import spendflow  # noqa: E402
+
+
+class FakeCanvas:
+    """Just enough of a Tk canvas: item coords/options and a scroll offset."""
+
+    def __init__(self, width):
+        self.width = width
+        self.left = 0
+        self.items = {}  # id -> {"coords": [...], "state": ...}
+
+    def _create(self, *coords, **options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, coords=list(coords), state="normal")
+        return item
+
+    create_line = create_rectangle = create_text = _create
+
+    def coords(self, item, *coords):
+        self.items[item]["coords"] = list(coords)
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+
+    def delete(self, item):
+        del self.items[item]
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, *args):
+        pass
+
+    def canvasx(self, x):
+        return self.left + x
+
+    def winfo_width(self):
+        return self.width
+
+
+def _shown_bars(chart):
+    """{label: slot} of the bars currently visible on the canvas."""
+    shown = {}
+    for label, (bar, _, _) in chart.items.items():
+        item = chart.canvas.items[bar]
+        if item["state"] == "normal":
+            x0, _, x1, _ = item["coords"]
+            shown[label] = ((x0 + x1) / 2 - chart.MARGIN) / chart.PITCH - 0.5
+    return shown
+
+
+def test_reranked_bars_do_not_overlap_offscreen():
+    canvas = FakeCanvas(width=spendflow.BarChart.PITCH)  # two slots in view
+    chart = spendflow.BarChart(canvas, height=200)
+    color_of = lambda label: "#fff"  # noqa: E731
+
+    chart.update({"A": 400, "B": 300, "C": 200, "D": 100}, color_of)
+    canvas.left = 2 * chart.PITCH  # scroll all four slots into view once
+    chart.draw_visible()
+    canvas.left = 0
+    chart.draw_visible()
+    assert _shown_bars(chart) == {"A": 0, "B": 1, "C": 2, "D": 3}
+
+    # D jumps to the front; B and C move to slots that are off-screen
+    chart.update({"A": 400, "B": 300, "C": 200, "D": 500}, color_of)
+    assert _shown_bars(chart) == {"D": 0, "A": 1}
+
+    canvas.left = 2 * chart.PITCH
+    chart.draw_visible()
+    assert _shown_bars(chart) == {"D": 0, "A": 1, "B": 2, "C": 3}
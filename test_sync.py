@@ -0,0 +1,127 @@
+"""Loopback tests for the SpendFlow delta sync (``SyncPeer``)."""
+
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("customtkinter")
+
+import spendflow  # noqa: E402
+
+
+class MemoryLedger:
+    """Stands in for ``update_ledger``: read-modify-write on a list."""
+
+    def __init__(self):
+        self.expenses = []
+        self.budgets = {}
+
+    def update(self, mutate):
+        mutate(self.expenses, self.budgets)
+        return {"expenses": self.expenses, "budgets": self.budgets}
+
+    def keys(self):
+        return sorted(spendflow.record_key(e) for e in self.expenses)
+
+
+def _row(rid, paise=12500, note=""):
+    return {
+        "id": rid,
+        "paise": paise,
+        "category": "Food",
+        "note": note,
+        "date": "2024-03-05",
+        "created_at": "2024-03-05 09:00:00",
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _sync(server_peer, client_peer):
+    """One session over 127.0.0.1; returns (server, client) results."""
+
+    async def session():
+        port = _free_port()
+        results = []
+        run_session = server_peer.run_session
+
+        async def recording(reader, writer):
+            results.append(await run_session(reader, writer))
+            return results[-1]
+
+        server_peer.run_session = recording
+        server = await server_peer.serve("127.0.0.1", port)
+        try:
+            client = await client_peer.sync_with("127.0.0.1", port)
+            for _ in range(100):
+                if results:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            server.close()
+            await server.wait_closed()
+            del server_peer.run_session
+        return results[0], client
+
+    return asyncio.run(session())
+
+
+@pytest.fixture
+def peers(tmp_path, monkeypatch):
+    # the ledger locks live in the working directory
+    monkeypatch.chdir(tmp_path)
+    a, b = MemoryLedger(), MemoryLedger()
+    peer_a = spendflow.SyncPeer(str(tmp_path / "a_sync.json"), update=a.update)
+    peer_b = spendflow.SyncPeer(str(tmp_path / "b_sync.json"), update=b.update)
+    return a, peer_a, b, peer_b
+
+
+def test_add_resync_and_delete_propagate(peers):
+    a, peer_a, b, peer_b = peers
+    a.expenses.append(_row("r1"))
+
+    server, client = _sync(peer_a, peer_b)
+    assert (server["sent"], client["received"]) == (1, 1)
+    assert b.keys() == ["r1"]
+    assert b.expenses[0]["paise"] == 12500
+
+    # nothing changed on either side: an empty session
+    server, client = _sync(peer_a, peer_b)
+    assert (server["sent"], server["received"]) == (0, 0)
+    assert (client["sent"], client["received"]) == (0, 0)
+
+    # a delete on B travels back to A as a tombstone
+    b.expenses.clear()
+    server, client = _sync(peer_a, peer_b)
+    assert (client["sent"], server["received"]) == (1, 1)
+    assert a.keys() == []
+    assert "r1" in peer_a.state["tombstones"]
+
+    server, client = _sync(peer_a, peer_b)
+    assert (server["sent"], client["sent"]) == (0, 0)
+
+
+def test_equal_rev_conflict_keeps_higher_device(peers):
+    a, peer_a, b, peer_b = peers
+    # both devices edit the same row at the same Lamport clock
+    a.expenses.append(_row("r1", 1000, note="from a"))
+    b.expenses.append(_row("r1", 2000, note="from b"))
+
+    _sync(peer_a, peer_b)
+
+    assert a.expenses[0]["rev"] == b.expenses[0]["rev"]
+    winner = max(peer_a.device_id, peer_b.device_id)
+    expected = "from a" if winner == peer_a.device_id else "from b"
+    for ledger in (a, b):
+        assert len(ledger.expenses) == 1
+        assert ledger.expenses[0]["device"] == winner
+        assert ledger.expenses[0]["note"] == expected
+
+    # converged: another session has nothing to ship
+    server, client = _sync(peer_a, peer_b)
+    assert (server["sent"], client["sent"]) == (0, 0)